@@ -0,0 +1,183 @@
+# batch_process.py
+# Runs the Detector/Recognizer pipeline without Qt or the servo over video
+# files, image folders or stream URLs and writes the per-frame results.
+#
+#   python batch_process.py footage/*.mp4 stills/ --format jsonl --out results --workers 4
+#   python batch_process.py rtsp://127.0.0.1:8554/cam --format csv --annotate
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+import cv2
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+CSV_FIELDS = ["source", "frame", "timestamp", "face_id", "x", "y", "w", "h",
+              "recognized", "name", "type", "confidence"]
+
+
+def iter_frames(source, image_fps):
+    # Yields (frame_index, timestamp_seconds, frame) for any supported source
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for index, name in enumerate(names):
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is not None:
+                yield index, index / image_fps, frame
+        return
+
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not capture.isOpened():
+        raise IOError(f"Cannot open source {source}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    is_file = os.path.isfile(source)
+    start = time.time()
+    index = 0
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            # Files use their own timeline, live streams the wall clock
+            timestamp = index / fps if is_file else time.time() - start
+            yield index, timestamp, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def output_stem(source):
+    # Readable name plus a short hash of the full source, so cam1.mp4 from two
+    # dated folders (or two URLs ending in /stream) get their own outputs
+    stem = source.rstrip("/\\")
+    full = stem if "://" in stem or stem.isdigit() else os.path.abspath(stem)
+    if "://" in stem:
+        stem = stem.split("://", 1)[1]
+    name = "".join(c if c.isalnum() or c in "-_." else "_" for c in os.path.basename(stem) or stem)
+    return f"{name}-{hashlib.sha1(full.encode('utf-8')).hexdigest()[:8]}"
+
+
+recognizers = {}  # One loaded model per process, shared by every source it handles
+
+
+def shared_recognizer(backend):
+    from recognizer import Recognizer
+    if backend not in recognizers:
+        recognizer = Recognizer(backend=backend)
+        recognizer.load_model()
+        recognizers[backend] = recognizer
+    return recognizers[backend]
+
+
+def process_source(source, args):
+    from detector import Detector  # Imported in the worker process
+
+    sightings = None
+    if args.sightings:
+        from sightings import SightingsLog
+        sightings = SightingsLog(args.sightings)
+        sightings.start()
+    detector = Detector(None, recognizer=shared_recognizer(args.backend),  # No servo
+                        processing_width=args.processing_width, expected_face_size=args.face_size,
+                        sightings=sightings, camera=str(source))
+    is_folder = os.path.isdir(source)
+    if args.detect_interval or is_folder:
+        # Fixed schedule for reproducible offline runs, every image is a new scene
+        detector.scheduler.adaptive = False
+        detector.scheduler.interval = args.detect_interval or 1
+
+    os.makedirs(args.out, exist_ok=True)
+    stem = output_stem(source)
+    result_path = os.path.join(args.out, f"{stem}.{args.format}")
+    writer = None
+    frames = faces = 0
+    started = time.perf_counter()
+    # The detector (and the sightings log) run on wall time anchored at the
+    # start of this run, the result rows keep the offset into the source
+    clock_base = time.time()
+
+    with open(result_path, "w", newline="") as f:
+        if args.format == "csv":
+            rows = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            rows.writeheader()
+        for index, timestamp, frame in iter_frames(source, args.image_fps):
+            if is_folder:
+                detector.reset()  # A still shares no faces with the previous one
+            processed, _ = detector.detect_faces(frame, timestamp=clock_base + timestamp)
+            if processed is None:
+                continue
+            frames += 1
+            faces += len(detector.last_results)
+
+            if args.format == "jsonl":
+                record = {"source": source, "frame": index, "timestamp": round(timestamp, 3),
+                          "faces": detector.last_results}
+                f.write(json.dumps(record) + "\n")
+            else:
+                for face in detector.last_results:
+                    x, y, w, h = face["bbox"]
+                    rows.writerow({"source": source, "frame": index, "timestamp": round(timestamp, 3),
+                                   "face_id": face["face_id"], "x": x, "y": y, "w": w, "h": h,
+                                   "recognized": face["recognized"], "name": face["name"],
+                                   "type": face["type"], "confidence": face["confidence"]})
+
+            if args.annotate:
+                if writer is None:
+                    height, width = processed.shape[:2]
+                    writer = cv2.VideoWriter(os.path.join(args.out, f"{stem}_annotated.mp4"),
+                                             cv2.VideoWriter_fourcc(*"mp4v"), args.video_fps, (width, height))
+                writer.write(processed)
+
+    if writer is not None:
+        writer.release()
+    detector.sample_writer.stop()
+    if sightings is not None:
+        detector.flush_sightings()
+        sightings.stop()
+    elapsed = time.perf_counter() - started
+    return {"source": source, "output": result_path, "frames": frames, "faces": faces,
+            "seconds": round(elapsed, 2), "fps": round(frames / elapsed, 1) if elapsed else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless face detection and recognition over recorded sources")
+    parser.add_argument("sources", nargs="+", help="Video files, image folders, stream URLs or camera indices")
+    parser.add_argument("--out", default="batch_output", help="Output folder")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--annotate", action="store_true", help="Also write an annotated video per source")
+    parser.add_argument("--workers", type=int, default=1, help="Processes, each handles whole sources")
+    parser.add_argument("--backend", default="lbph", help="Recognizer backend: lbph or embedding")
+    parser.add_argument("--detect-interval", type=int, default=0,
+                        help="Run the detector every N frames (default: adaptive for videos, 1 for image folders)")
+    parser.add_argument("--processing-width", type=int, default=640,
+                        help="Detect and track on frames downscaled to this width (0 = full resolution)")
+    parser.add_argument("--face-size", type=int, default=None,
+                        help="Expected face size in px, picks a pyramid level instead of --processing-width")
+    parser.add_argument("--sightings", default=None,
+                        help="Also log track start/end and identities to daily SQLite files in this folder")
+    parser.add_argument("--image-fps", type=float, default=1.0, help="Timeline spacing for image folders")
+    parser.add_argument("--video-fps", type=float, default=25.0, help="Frame rate of annotated videos")
+    args = parser.parse_args()
+    stems = [output_stem(source) for source in args.sources]
+    duplicates = sorted({source for source, stem in zip(args.sources, stems) if stems.count(stem) > 1})
+    if duplicates:
+        parser.error(f"Sources given more than once: {', '.join(duplicates)}")
+
+    if args.workers <= 1 or len(args.sources) == 1:
+        for source in args.sources:
+            print(json.dumps(process_source(source, args)))
+        return
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(process_source, source, args): source for source in args.sources}
+        for future in as_completed(futures):
+            try:
+                print(json.dumps(future.result()))
+            except Exception as e:
+                print(json.dumps({"source": futures[future], "error": str(e)}))
+
+
+if __name__ == "__main__":
+    main()
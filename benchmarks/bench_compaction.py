@@ -0,0 +1,71 @@
+# benchmarks/bench_compaction.py
+# LBPH gallery with every captured sample against per-user k-medoid
+# prototypes: model size, single-face predict latency and rank-1 accuracy
+# on held-out probes. Samples are jittered (shift and brightness) so each
+# user's gallery has real spread to cluster.
+#
+#   python benchmarks/bench_compaction.py --users 30 --samples 100 --prototypes 5 10 20
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import percentile
+from recognizer_backends import LBPHBackend
+from synthetic import make_gallery
+
+
+def evaluate(model, probes, work_dir):
+    path = os.path.join(work_dir, "model.lbph")
+    model.save(path)
+    size = os.path.getsize(path)
+    latencies, correct, distances = [], 0, []
+    for user_id, probe in probes:
+        start = time.perf_counter()
+        label, distance = model.predict(probe)
+        latencies.append(time.perf_counter() - start)
+        correct += label == user_id
+        distances.append(distance)
+    latencies.sort()
+    return {"rows": len(model.state[1]), "size_mb": size / 1e6,
+            "p50_ms": percentile(latencies, 50) * 1000, "p95_ms": percentile(latencies, 95) * 1000,
+            "accuracy": correct / len(probes), "distance": float(np.mean(distances))}
+
+
+def bench(users, samples, prototypes, probes_per_user, jitter):
+    faces, labels, probes = make_gallery(users, samples, probes_per_user=probes_per_user, jitter=jitter)
+    work_dir = tempfile.mkdtemp(prefix="bench_compact_")
+    try:
+        full = LBPHBackend()
+        full.train(faces, labels)
+        rows = [("all samples", 0.0, evaluate(full, probes, work_dir))]
+        for k in prototypes:
+            compact = LBPHBackend()
+            compact.state = full.state
+            start = time.perf_counter()
+            compact.compact(k)
+            rows.append((f"{k} per user", time.perf_counter() - start, evaluate(compact, probes, work_dir)))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LBPH gallery compaction: size, latency, accuracy")
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--samples", type=int, default=100, help="Captured samples per user")
+    parser.add_argument("--prototypes", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--probes", type=int, default=5, help="Held-out probes per user")
+    parser.add_argument("--jitter", type=float, default=3.0, help="Max sample shift in px")
+    args = parser.parse_args()
+
+    print(f"{args.users} users x {args.samples} samples, {args.users * args.probes} probes")
+    print(f"{'gallery':<14} {'rows':>6} {'size MB':>8} {'compact s':>10} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'accuracy':>9} {'mean dist':>10}")
+    for name, compact_time, r in bench(args.users, args.samples, args.prototypes, args.probes, args.jitter):
+        print(f"{name:<14} {r['rows']:>6} {r['size_mb']:>8.1f} {compact_time:>10.2f} {r['p50_ms']:>8.2f} "
+              f"{r['p95_ms']:>8.2f} {r['accuracy']:>8.1%} {r['distance']:>10.1f}")
@@ -0,0 +1,61 @@
+# benchmarks/bench_enrollment.py
+# Compares a full rebuild of the LBPH model against incremental enrollment of
+# one new user, for galleries of different sizes.
+#
+#   python benchmarks/bench_enrollment.py --users 10 100 1000 --samples 10
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from recognizer import Recognizer
+from synthetic import make_dataset
+
+
+def bench(users, samples):
+    work_dir = tempfile.mkdtemp(prefix="bench_enroll_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(work_dir)  # Model, label map and users file are relative paths
+        make_dataset("dataset", users + 1, samples)
+        new_user = f"user_{users}"
+        shutil.move(os.path.join("dataset", new_user), new_user)
+
+        recognizer = Recognizer()
+        recognizer.train_model("dataset")  # Existing gallery of `users` users
+
+        # Incremental: feed only the new user's samples through update()
+        shutil.move(new_user, os.path.join("dataset", new_user))
+        start = time.perf_counter()
+        recognizer.enroll_user(new_user, "dataset")
+        enroll_time = time.perf_counter() - start
+
+        # Part of the enrollment spent persisting the whole model file
+        start = time.perf_counter()
+        recognizer.save_model()
+        save_time = time.perf_counter() - start
+
+        # Full rebuild over every folder, as before
+        start = time.perf_counter()
+        Recognizer().train_model("dataset")
+        rebuild_time = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return enroll_time, save_time, rebuild_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental enrollment vs full rebuild")
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--samples", type=int, default=10, help="Samples per user")
+    args = parser.parse_args()
+
+    print(f"{'users':>6} {'enroll (s)':>12} {'of it save':>12} {'rebuild (s)':>12} {'speedup':>8}")
+    for users in args.users:
+        enroll_time, save_time, rebuild_time = bench(users, args.samples)
+        print(f"{users:>6} {enroll_time:>12.3f} {save_time:>12.3f} {rebuild_time:>12.3f} "
+              f"{rebuild_time / enroll_time:>7.1f}x")
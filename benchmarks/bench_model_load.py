@@ -0,0 +1,77 @@
+# benchmarks/bench_model_load.py
+# Load time of an LBPH model saved as OpenCV YAML (what face_model.yml used
+# to be) against the binary store (face_model.lbph), for galleries of
+# different sizes. "first predict" includes the first query, which is
+# where a memory-mapped store actually pages the histograms in.
+#
+#   python benchmarks/bench_model_load.py --users 10 100 300 --samples 10
+import os
+import sys
+import cv2
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from recognizer_backends import LBPHBackend
+from synthetic import make_gallery
+
+
+def timed(task):
+    start = time.perf_counter()
+    result = task()
+    return time.perf_counter() - start, result
+
+
+def bench(users, samples):
+    faces, labels, probes = make_gallery(users, samples)
+    probe = probes[0][1]
+    work_dir = tempfile.mkdtemp(prefix="bench_load_")
+    try:
+        yaml_path = os.path.join(work_dir, "face_model.yml")
+        store_path = os.path.join(work_dir, "face_model.lbph")
+        model = LBPHBackend()
+        model.train(faces, labels)
+        save_yaml, _ = timed(lambda: model.save(yaml_path))
+        save_store, _ = timed(lambda: model.save(store_path))
+
+        # The old path: cv2.face parses the YAML
+        def load_cv2():
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.read(yaml_path)
+            return recognizer
+        load_yaml, recognizer = timed(load_cv2)
+        first_yaml, expected = timed(lambda: recognizer.predict(probe))
+
+        def load_backend():
+            backend = LBPHBackend()
+            backend.load(store_path)
+            return backend
+        load_store, backend = timed(load_backend)
+        first_store, result = timed(lambda: backend.predict(probe))
+        if result[0] != expected[0] or not np.isclose(result[1], expected[1]):
+            raise RuntimeError(f"Store prediction {result} differs from OpenCV {expected}")
+        sizes = (os.path.getsize(yaml_path), os.path.getsize(store_path))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {"rows": len(labels), "yaml_mb": sizes[0] / 1e6, "store_mb": sizes[1] / 1e6,
+            "save_yaml": save_yaml, "save_store": save_store, "load_yaml": load_yaml,
+            "load_store": load_store, "first_yaml": load_yaml + first_yaml,
+            "first_store": load_store + first_store}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenCV YAML vs binary store model loading")
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 100, 300])
+    parser.add_argument("--samples", type=int, default=10, help="Samples per user")
+    args = parser.parse_args()
+
+    print(f"{'rows':>6} {'yaml MB':>8} {'store MB':>9} {'save yaml':>10} {'save store':>11} "
+          f"{'load yaml':>10} {'load store':>11} {'1st pred yaml':>14} {'1st pred store':>15}")
+    for users in args.users:
+        r = bench(users, args.samples)
+        print(f"{r['rows']:>6} {r['yaml_mb']:>8.1f} {r['store_mb']:>9.1f} {r['save_yaml']:>9.3f}s "
+              f"{r['save_store']:>10.3f}s {r['load_yaml']:>9.3f}s {r['load_store']:>10.4f}s "
+              f"{r['first_yaml']:>13.3f}s {r['first_store']:>14.3f}s")
@@ -0,0 +1,319 @@
+# benchmarks/run_benchmarks.py
+# Reproducible latency benchmarks for the frame-loop hot paths:
+# Detector.detect_faces, Recognizer.recognize_face, Recognizer.train_model,
+# TrackStore.match and MainWindow.convert_cv_qt, plus detect_faces fps and
+# recognition accuracy at several processing resolutions.
+#
+#   python benchmarks/run_benchmarks.py --output results.json
+#   python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+#   python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json   # exit 1 on regression
+#   python benchmarks/run_benchmarks.py --frames recorded/ --faces 1          # real detector on recorded frames
+import os
+import sys
+import cv2
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from metrics import percentile
+from synthetic import SyntheticScene, SyntheticFaceDetector, make_dataset, make_gallery, make_sample
+
+
+class StubSignal:
+    def emit(self, *args):
+        pass
+
+
+class StubServo:
+    # Active, so the lock-target path is exercised, but talks to nothing
+    active = True
+    set_target_signal = StubSignal()
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB elsewhere
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except (ImportError, AttributeError):
+            return None
+
+
+def measure(fn, iterations, warmup=3):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    mean = sum(samples) / len(samples)
+    return {
+        "iterations": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "mean_ms": mean * 1000,
+        "fps": 1 / mean if mean else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def load_recorded_frames(folder):
+    names = sorted(n for n in os.listdir(folder) if n.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+    frames = [cv2.imread(os.path.join(folder, n)) for n in names]
+    return [f for f in frames if f is not None]
+
+
+def bench_detect_faces(args, results):
+    from detector import Detector
+    for count in args.faces:
+        detector = Detector(StubServo())
+        if args.frames:
+            frames = load_recorded_frames(args.frames)
+            next_frame = lambda i: frames[i % len(frames)].copy()
+            key = f"detect_faces/recorded"
+        else:
+            scene = SyntheticScene(count, seed=count)
+            detector.detector = SyntheticFaceDetector(scene)
+            next_frame = scene.frame
+            key = f"detect_faces/{count}_faces"
+        if args.detect_interval:
+            detector.scheduler.adaptive = False
+            detector.scheduler.interval = args.detect_interval
+
+        counter = {"i": 0}
+
+        def step():
+            detector.detect_faces(next_frame(counter["i"]))
+            counter["i"] += 1
+
+        results[key] = measure(step, args.iterations)
+        detector.sample_writer.stop()
+        if args.frames:
+            break  # Recorded frames define the face count themselves
+
+
+def bench_processing_size(args, results):
+    # 1080p synthetic scene processed at 1080p, 720p and 480p. Accuracy is the
+    # share of per-face results naming the face that is really at that spot.
+    from detector import Detector
+    for count in args.faces:
+        scene = SyntheticScene(count, frame_shape=(1080, 1920), size=160, seed=count)
+        rng = np.random.default_rng(count)
+        faces, labels = [], []
+        for user_id, face in enumerate(scene.faces):
+            gray = cv2.resize(cv2.cvtColor(face, cv2.COLOR_BGR2GRAY), (100, 100), interpolation=cv2.INTER_AREA)
+            faces += [make_sample(rng, gray) for _ in range(args.samples)]
+            labels += [user_id] * args.samples
+
+        for width in args.processing_widths:
+            detector = Detector(StubServo(), recognizer_backend=args.backend, processing_width=width)
+            detector.detector = SyntheticFaceDetector(scene)
+            recognizer = detector.recognizer
+            # Same normalization as the app's training and live crops
+            recognizer.backend.train([recognizer.preprocessor(face) for face in faces], labels)
+            recognizer.model_loaded = True
+            recognizer.label_map = {str(u): {"name": f"user_{u}", "type": "User"} for u in range(count)}
+            # The synthetic detector costs nothing, so a fixed interval keeps
+            # tracking frames in the mix (default: detect every 5th frame)
+            detector.scheduler.adaptive = False
+            detector.scheduler.interval = args.detect_interval or 5
+
+            counter = {"i": 0, "correct": 0, "total": 0}
+
+            def step():
+                index = counter["i"]
+                detector.detect_faces(scene.frame(index))
+                truth = [(x + w / 2, y + h / 2) for x, y, w, h in scene.boxes(index)]
+                for result in detector.last_results:
+                    x, y, w, h = result["bbox"]
+                    distances = [np.hypot(x + w / 2 - cx, y + h / 2 - cy) for cx, cy in truth]
+                    counter["correct"] += result["name"] == f"user_{int(np.argmin(distances))}"
+                    counter["total"] += 1
+                counter["i"] += 1
+
+            summary = measure(step, args.iterations)
+            summary["accuracy"] = counter["correct"] / counter["total"] if counter["total"] else None
+            results[f"processing_size/{round(width * 9 / 16)}p_{count}_faces"] = summary
+            detector.sample_writer.stop()
+
+
+def bench_recognize_face(args, results):
+    from recognizer import Recognizer
+    for users in args.gallery_users:
+        faces, labels, probes = make_gallery(users, args.samples, seed=users)
+        recognizer = Recognizer(backend=args.backend)
+        # In memory, no model file, normalized like the app's training samples
+        recognizer.backend.train([recognizer.preprocessor(face) for face in faces], labels)
+        recognizer.model_loaded = True
+        recognizer.label_map = {str(u): {"name": f"user_{u}", "type": "User"} for u in range(users)}
+        crops = [cv2.cvtColor(probe, cv2.COLOR_GRAY2BGR) for _, probe in probes]
+        counter = {"i": 0}
+
+        def step():
+            recognizer.recognize_face(crops[counter["i"] % len(crops)])
+            counter["i"] += 1
+
+        results[f"recognize_face/{users}_users"] = measure(step, args.iterations)
+
+
+def bench_train_model(args, results):
+    from recognizer import Recognizer
+    for users in args.train_users:
+        dataset_path = os.path.join(args.work_dir, f"dataset_{users}")
+        make_dataset(dataset_path, users, args.samples, seed=users)
+        recognizer = Recognizer(backend=args.backend)
+        recognizer.dataset_loader.cache_dir = os.path.join(args.work_dir, f"cache_{users}")
+        results[f"train_model/{users}_users"] = measure(lambda: recognizer.train_model(dataset_path),
+                                                        args.train_iterations, warmup=1)
+
+
+def bench_associate(args, results):
+    from detector import Detector
+    for count in args.faces:
+        detector = Detector(StubServo())
+        boxes = SyntheticScene(count).boxes(0)
+        for box in boxes:
+            detector.tracks.create(detector.tracks.new_face_id(), tuple(box), 0.0, 0)
+        detections = [tuple(box) for box in boxes]
+
+        def step():
+            detector.tracks.match(detections)
+
+        results[f"associate/{count}_tracks"] = measure(step, args.iterations)
+        detector.sample_writer.stop()
+
+
+def bench_convert_cv_qt(args, results):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtWidgets import QApplication
+        from main import MainWindow, QIMAGE_BGR888
+        from pipeline import DisplayBuffers
+    except ImportError as e:
+        results["convert_cv_qt"] = {"skipped": str(e)}
+        return
+    app = QApplication.instance() or QApplication(["benchmark"])
+    frame = SyntheticScene(1).frame(0)
+    window = MainWindow.__new__(MainWindow)  # Conversion only, no camera, servo or widgets
+    buffers = DisplayBuffers(size=(800, 600), rgb=QIMAGE_BGR888 is None)
+    # Worker-side resize plus the GUI-side wrap, as in CaptureVideo.run/show_webcam
+    results["convert_cv_qt"] = measure(lambda: MainWindow.convert_cv_qt(window, buffers.fit(frame)),
+                                       args.iterations)
+
+
+def compare(results, baseline, tolerance):
+    # A stage regresses when its p50 is more than `tolerance` slower than the baseline
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get("results", {}).get(key)
+        if not previous or "p50_ms" not in previous or "p50_ms" not in current:
+            continue
+        ratio = current["p50_ms"] / previous["p50_ms"] if previous["p50_ms"] else 1.0
+        current["baseline_p50_ms"] = previous["p50_ms"]
+        current["change"] = ratio - 1
+        if ratio > 1 + tolerance:
+            regressions.append((key, previous["p50_ms"], current["p50_ms"], ratio - 1))
+    return regressions
+
+
+STAGES = {
+    "detect_faces": bench_detect_faces,
+    "processing_size": bench_processing_size,
+    "recognize_face": bench_recognize_face,
+    "train_model": bench_train_model,
+    "associate": bench_associate,
+    "convert_cv_qt": bench_convert_cv_qt,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detection, tracking and recognition hot paths")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 5, 20], help="Faces per synthetic frame")
+    parser.add_argument("--gallery-users", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--train-users", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--samples", type=int, default=5, help="Samples per user in galleries and datasets")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--train-iterations", type=int, default=3)
+    parser.add_argument("--backend", default="lbph", help="Recognizer backend: lbph or embedding")
+    parser.add_argument("--detect-interval", type=int, default=0, help="Fix the detection interval (0 = adaptive)")
+    parser.add_argument("--processing-widths", type=int, nargs="+", default=[1920, 1280, 854],
+                        help="Detector processing widths for the processing_size stage")
+    parser.add_argument("--frames", help="Folder of recorded frames, uses the real face detector")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Compare against a saved results file")
+    parser.add_argument("--save-baseline", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed p50 slowdown before failing")
+    args = parser.parse_args()
+
+    if args.frames:
+        args.frames = os.path.abspath(args.frames)
+    cv2.setRNGSeed(0)
+    np.random.seed(0)
+    results = {}
+    cwd = os.getcwd()
+    args.work_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        os.chdir(args.work_dir)  # Models, label maps and users.db are created here
+        for stage in args.stages:
+            print(f"Running {stage}...", file=sys.stderr)
+            STAGES[stage](args, results)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(args.work_dir, ignore_errors=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "opencv": cv2.__version__, "cpus": os.cpu_count()},
+        "config": {k: v for k, v in vars(args).items() if k not in ("work_dir",)},
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+    print(f"{'stage':<32} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'fps':>9} {'rss MB':>8} {'vs base':>8}")
+    for key, r in results.items():
+        if "p50_ms" not in r:
+            print(f"{key:<32} {r.get('skipped', '')}")
+            continue
+        change = f"{r['change'] * 100:+.0f}%" if "change" in r else ""
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        accuracy = f"  accuracy {r['accuracy'] * 100:.1f}%" if r.get("accuracy") is not None else ""
+        print(f"{key:<32} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['fps']:>9.1f} "
+              f"{rss:>8} {change:>8}{accuracy}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if regressions:
+        print("\nRegressions:")
+        for key, before, after, change in regressions:
+            print(f"  {key}: {before:.3f} ms -> {after:.3f} ms ({change * 100:+.0f}%)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/synthetic.py
+# Synthetic faces, datasets and frames shared by the benchmark scripts.
+import os
+import cv2
+import numpy as np
+
+
+def make_identity(rng, size=100):
+    # A smooth random pattern that plays the role of one person's face
+    return cv2.GaussianBlur(rng.integers(0, 256, (size, size), dtype=np.uint8), (7, 7), 0)
+
+
+def make_sample(rng, identity, noise=15, jitter=0):
+    # jitter > 0 adds a shift of up to `jitter` px and up to 25% brightness
+    # change, the head movement and lighting spread of a real capture
+    if jitter:
+        dx, dy = rng.uniform(-jitter, jitter, 2)
+        shift = np.float32([[1, 0, dx], [0, 1, dy]])
+        identity = cv2.warpAffine(identity, shift, identity.shape[::-1], borderMode=cv2.BORDER_REFLECT)
+        identity = identity * rng.uniform(0.75, 1.25)
+    sample = identity.astype(np.int16) + rng.integers(-noise, noise + 1, identity.shape)
+    return np.clip(sample, 0, 255).astype(np.uint8)
+
+
+def make_dataset(dataset_path, users, samples, size=100, seed=0):
+    # dataset/user_<id>/<n>.jpg, the same layout as a real registration
+    rng = np.random.default_rng(seed)
+    for user_id in range(users):
+        folder = os.path.join(dataset_path, f"user_{user_id}")
+        os.makedirs(folder, exist_ok=True)
+        identity = make_identity(rng, size)
+        for i in range(samples):
+            cv2.imwrite(os.path.join(folder, f"{i}.jpg"), make_sample(rng, identity))
+
+
+def make_gallery(users, samples, size=100, seed=0, probes_per_user=1, jitter=0):
+    # In-memory faces/labels plus extra probes per user
+    rng = np.random.default_rng(seed)
+    faces, labels, probes = [], [], []
+    for user_id in range(users):
+        identity = make_identity(rng, size)
+        for _ in range(samples):
+            faces.append(make_sample(rng, identity, jitter=jitter))
+            labels.append(user_id)
+        for _ in range(probes_per_user):
+            probes.append((user_id, make_sample(rng, identity, jitter=jitter)))
+    return faces, labels, probes
+
+
+def face_boxes(count, frame_shape=(720, 1280), size=100):
+    # Non-overlapping boxes laid out on a grid
+    height, width = frame_shape
+    columns = max(1, width // (size + 120))
+    boxes = []
+    for i in range(count):
+        row, column = divmod(i, columns)
+        boxes.append((40 + column * (size + 120), 40 + row * (size + 70), size, size))
+        if boxes[-1][1] + size > height:
+            raise ValueError(f"{count} faces do not fit in a {width}x{height} frame")
+    return boxes
+
+
+class SyntheticScene:
+    # Frames with `count` faces drifting a few pixels per frame, and the boxes
+    # a face detector would report for them
+    def __init__(self, count, frame_shape=(720, 1280), size=100, seed=0):
+        rng = np.random.default_rng(seed)
+        self.frame_shape = frame_shape
+        self.base_boxes = face_boxes(count, frame_shape, size)
+        self.faces = [cv2.cvtColor(make_identity(rng, size), cv2.COLOR_GRAY2BGR) for _ in range(count)]
+        self.background = rng.integers(0, 60, frame_shape + (3,), dtype=np.uint8)
+
+    def boxes(self, index):
+        shift = index % 10
+        return [(x + shift, y + shift // 2, w, h) for x, y, w, h in self.base_boxes]
+
+    def frame(self, index):
+        frame = self.background.copy()
+        for face, (x, y, w, h) in zip(self.faces, self.boxes(index)):
+            frame[y:y + h, x:x + w] = face
+        return frame
+
+
+class SyntheticFaceDetector:
+    # Stands in for cvzone's FaceDetector, returning the scene's known boxes
+    # scaled to the size of the frame it is given
+    def __init__(self, scene):
+        self.scene = scene
+        self.index = 0
+
+    def findFaces(self, img, draw=False):
+        scale = img.shape[1] / self.scene.frame_shape[1]
+        boxes = [tuple(int(round(v * scale)) for v in box) for box in self.scene.boxes(self.index)]
+        self.index += 1
+        return img, [{"id": i, "bbox": box, "score": [0.99], "center": (box[0] + box[2] // 2, box[1] + box[3] // 2)}
+                     for i, box in enumerate(boxes)]
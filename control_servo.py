@@ -1,11 +1,8 @@
 # control_servo.py
-import pyfirmata
-from pyfirmata import util
 from PyQt5.QtCore import QThread, pyqtSignal, pyqtSlot
 import numpy as np
 import time
 import threading
-import serial
 
 class ControlServo(QThread):
     # Tín hiệu để nhận tọa độ mục tiêu
@@ -28,6 +25,22 @@ class ControlServo(QThread):
         self.current_x = 90  # Vị trí hiện tại của servo X
         self.current_y = 90  # Vị trí hiện tại của servo Y
 
+        # Kết nối tín hiệu để nhận mục tiêu
+        self.set_target_signal.connect(self.set_target)
+
+    def connect(self):
+        # Runs on the servo thread: the serial probe and the board's start-up
+        # waits no longer hold up the window. pyfirmata and pyserial are only
+        # imported here, a missing library just leaves the servo inactive.
+        try:
+            import serial
+            import pyfirmata
+            from pyfirmata import util
+        except ImportError as e:
+            print(f"Servo control unavailable: {e}")
+            self.connection_status_signal.emit(False, f"Servo control unavailable: {e}")
+            return
+
         try:
             # Kết nối tới Arduino
             self.board = pyfirmata.Arduino(self.port, baudrate=self.baudrate)
@@ -64,10 +77,8 @@ class ControlServo(QThread):
             print(f"Error initializing ControlServo: {e}")
             self.connection_status_signal.emit(False, f"Error initializing ControlServo: {e}")
 
-        # Kết nối tín hiệu để nhận mục tiêu
-        self.set_target_signal.connect(self.set_target)
-
     def run(self):
+        self.connect()
         while self.running:
             if self.active:
                 with self.lock:
@@ -99,9 +110,6 @@ class ControlServo(QThread):
                 with self.lock:
                     self.current_x = current_x
                     self.current_y = current_y
-
-                # In ra vị trí hiện tại của servo để theo dõi
-                print(f"Servo X: {self.current_x}°, Servo Y: {self.current_y}°")
             # Thời gian chờ ngắn để điều chỉnh tốc độ cập nhật
             time.sleep(0.02)  # 50Hz
 
@@ -120,6 +128,5 @@ class ControlServo(QThread):
                 self.target_y = np.interp(fy, [0, hs], [0, 180])
                 self.target_x = max(0, min(180, self.target_x))
                 self.target_y = max(0, min(180, self.target_y))
-                print(f"Updated target -> X: {self.target_x}, Y: {self.target_y}")
         else:
             print("Servo control is inactive. Target not set.")
@@ -0,0 +1,178 @@
+# dataset_loader.py
+import os
+import cv2
+import json
+import hashlib
+import zipfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DatasetLoader:
+    # Loads the grayscale samples of a user folder. Decoding runs on a thread
+    # pool and the decoded pixels are packed into one .npy per user, with a
+    # manifest (path, size, mtime, hash) so unchanged images are never
+    # decoded twice. Cached samples are returned as views of a memory map.
+    # With a preprocess callable (preprocess.FacePreprocessor) the cache holds
+    # normalized samples, and is rebuilt when the preprocessing key changes.
+    MANIFEST_VERSION = 2
+
+    def __init__(self, cache_dir=".dataset_cache", workers=None, preprocess=None):
+        self.cache_dir = cache_dir
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.preprocess = preprocess
+        self.executor = None
+        self.decoded = 0  # Images decoded since start
+        self.reused = 0   # Images served from the packed cache
+
+    def load_user(self, user_folder):
+        if not os.path.isdir(user_folder):
+            return []
+        key = os.path.basename(os.path.normpath(user_folder))
+        sources = self.scan(user_folder)
+        manifest, packed = self.load_cache(key)
+        cached = {entry["path"]: entry for entry in manifest}
+
+        # Fast path: nothing was added, removed or touched
+        if packed is not None and len(cached) == len(sources) and all(
+                self.same_stat(cached.get(src["path"]), src) for src in sources):
+            self.reused += len(sources)
+            return [self.view(packed, cached[src["path"]]) for src in sources]
+
+        by_hash = {entry["hash"]: entry for entry in manifest}
+        images = [None] * len(sources)
+        pending = []
+        for i, src in enumerate(sources):
+            entry = cached.get(src["path"])
+            if packed is not None and self.same_stat(entry, src):
+                images[i] = self.view(packed, entry)
+                src["hash"] = entry["hash"]
+            else:
+                pending.append(i)
+
+        # Changed or new files: read them once, reuse the pixels if the content
+        # hash is already known (e.g. only the mtime moved), decode otherwise
+        if pending:
+            to_decode = []
+            results = self.pool().map(lambda i: self.read_source(sources[i]), pending)
+            for i, (digest, data) in zip(pending, results):
+                sources[i]["hash"] = digest
+                entry = by_hash.get(digest)
+                if packed is not None and entry is not None:
+                    images[i] = self.view(packed, entry)
+                    self.reused += 1
+                else:
+                    to_decode.append((i, data))
+            decoded = self.pool().map(self.decode, [data for _, data in to_decode])
+            for (i, _), gray in zip(to_decode, decoded):
+                images[i] = gray
+                self.decoded += 1
+        self.reused += len(sources) - len(pending)
+
+        keep = [i for i, gray in enumerate(images) if gray is not None]
+        sources = [sources[i] for i in keep]
+        images = [images[i] for i in keep]
+        packed = cached = by_hash = None  # Let the old memory map close before it is replaced
+        return self.save_cache(key, sources, images)
+
+    def scan(self, user_folder):
+        # Loose .jpg samples plus the members of any samples.zip archive
+        sources = []
+        with os.scandir(user_folder) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                name = entry.name.lower()
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if name.endswith(".jpg"):
+                    sources.append({"path": entry.path, "size": stat.st_size, "mtime": stat.st_mtime_ns})
+                elif name.endswith(".zip"):
+                    with zipfile.ZipFile(entry.path) as archive:
+                        for info in archive.infolist():
+                            if info.filename.lower().endswith(".jpg"):
+                                sources.append({"path": f"{entry.path}!{info.filename}", "size": info.file_size,
+                                                "mtime": stat.st_mtime_ns, "crc": info.CRC})
+        return sources
+
+    def same_stat(self, entry, src):
+        return entry is not None and entry["size"] == src["size"] and entry["mtime"] == src["mtime"] \
+            and entry.get("crc") == src.get("crc")
+
+    def read_source(self, src):
+        # Returns (content hash, encoded bytes)
+        if "!" in src["path"]:
+            archive_path, member = src["path"].split("!", 1)
+            with zipfile.ZipFile(archive_path) as archive:
+                data = archive.read(member)
+        else:
+            with open(src["path"], "rb") as f:
+                data = f.read()
+        return hashlib.blake2b(data, digest_size=16).hexdigest(), data
+
+    def decode(self, data):
+        gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is not None and self.preprocess is not None:
+            gray = self.preprocess(gray)
+        return gray
+
+    def preprocess_key(self):
+        return getattr(self.preprocess, "key", None)
+
+    def view(self, packed, entry):
+        height, width = entry["shape"]
+        return packed[entry["offset"]:entry["offset"] + height * width].reshape(height, width)
+
+    def pool(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    def cache_paths(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json"), os.path.join(self.cache_dir, f"{key}.npy")
+
+    def load_cache(self, key):
+        manifest_path, packed_path = self.cache_paths(key)
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") != self.MANIFEST_VERSION or \
+                    manifest.get("preprocess") != self.preprocess_key():
+                return [], None
+            packed = np.load(packed_path, mmap_mode="r")
+            return manifest["entries"], packed
+        except (OSError, ValueError, KeyError):
+            return [], None
+
+    def save_cache(self, key, sources, images):
+        # Pack every sample into one flat uint8 array and rewrite the manifest
+        entries = []
+        offset = 0
+        for src, gray in zip(sources, images):
+            entry = dict(src)
+            entry["offset"] = offset
+            entry["shape"] = list(gray.shape)
+            entries.append(entry)
+            offset += gray.size
+        packed = np.empty(offset, np.uint8)
+        for entry, gray in zip(entries, images):
+            packed[entry["offset"]:entry["offset"] + gray.size] = gray.ravel()
+        images.clear()  # Drops the last views of the previous cache file
+
+        manifest_path, packed_path = self.cache_paths(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_packed = packed_path + ".tmp.npy"
+            np.save(tmp_packed, packed)
+            os.replace(tmp_packed, packed_path)
+            tmp_manifest = manifest_path + ".tmp"
+            with open(tmp_manifest, "w") as f:
+                json.dump({"version": self.MANIFEST_VERSION, "preprocess": self.preprocess_key(),
+                           "entries": entries}, f)
+            os.replace(tmp_manifest, manifest_path)
+        except OSError as e:
+            # The cache only saves time, training goes on without it
+            print(f"Could not update dataset cache for {key}: {e}")
+        return [self.view(packed, entry) for entry in entries]
+
+    def stats(self):
+        return {"decoded": self.decoded, "reused": self.reused}
@@ -0,0 +1,69 @@
+# detection_scheduler.py
+import math
+
+
+class DetectionScheduler:
+    # Decides on which frames the full face detector runs. In between, the
+    # KCF trackers carry the boxes. The interval adapts so that the average
+    # cost of one detect/track cycle stays inside the per-frame budget.
+    def __init__(self, interval=5, min_interval=1, max_interval=15, frame_budget=1 / 30, smoothing=0.1):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.frame_budget = frame_budget  # Seconds available per frame
+        self.smoothing = smoothing        # Weight of the newest sample in the moving averages
+        self.adaptive = True
+
+        self.detect_time = None  # Moving average of a detection frame (seconds)
+        self.track_time = None   # Moving average of a tracking-only frame (seconds)
+        self.frames_since_detection = 0
+        self.force = True  # Always detect on the first frame
+        self.detections = 0
+        self.tracked_frames = 0
+
+    def should_detect(self):
+        return self.force or self.frames_since_detection >= self.interval - 1
+
+    def request_detection(self):
+        # A tracker lost its target, run the detector on the next frame
+        self.force = True
+
+    def record(self, detected, elapsed):
+        if detected:
+            self.detect_time = self.average(self.detect_time, elapsed)
+            self.frames_since_detection = 0
+            self.force = False
+            self.detections += 1
+        else:
+            self.track_time = self.average(self.track_time, elapsed)
+            self.frames_since_detection += 1
+            self.tracked_frames += 1
+
+        if self.adaptive:
+            self.adapt()
+
+    def average(self, current, sample):
+        if current is None:
+            return sample
+        return current + self.smoothing * (sample - current)
+
+    def adapt(self):
+        if self.detect_time is None or self.track_time is None:
+            return
+        # Smallest N with (detect + (N - 1) * track) / N <= budget
+        if self.detect_time <= self.frame_budget:
+            interval = self.min_interval
+        elif self.track_time >= self.frame_budget:
+            interval = self.max_interval
+        else:
+            interval = math.ceil((self.detect_time - self.track_time) / (self.frame_budget - self.track_time))
+        self.interval = max(self.min_interval, min(self.max_interval, interval))
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "detections": self.detections,
+            "tracked_frames": self.tracked_frames,
+            "detect_ms": None if self.detect_time is None else self.detect_time * 1000,
+            "track_ms": None if self.track_time is None else self.track_time * 1000,
+        }
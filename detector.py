@@ -1,32 +1,103 @@
 # detector.py
-import os
 import cv2
 import time
-import numpy as np
-import pandas as pd
 from recognizer import Recognizer
-from cvzone.FaceDetectionModule import FaceDetector
+from recognition_cache import RecognitionCache
+from detection_scheduler import DetectionScheduler
+from sample_writer import SampleWriter
+from sample_quality import SampleSelector
+from metrics import FrameMetrics
+from tracks import TrackStore
+
+# Smallest face (px) worth handing to the detector when a pyramid level is
+# picked from the expected face size
+MIN_DETECTION_FACE = 40
+
+
+def scale_box(box, factor):
+    return tuple(int(round(v * factor)) for v in box)
+
+
+def tracker_box(box, scale):
+    # Processing-frame box for KCF with sides rounded to a multiple of 8
+    # around the same centre. KCF's cost jumps several-fold for some patch
+    # sizes (71 px: ~28 ms, 72 px: ~6 ms), and it never resizes the box, so
+    # the full-resolution box is rebuilt from the tracked centre.
+    x, y, w, h = box
+    cx, cy = (x + w / 2) * scale, (y + h / 2) * scale
+    tw, th = max(8, int(round(w * scale / 8)) * 8), max(8, int(round(h * scale / 8)) * 8)
+    return int(round(cx - tw / 2)), int(round(cy - th / 2)), tw, th
+
+
+def load_face_detector():
+    # cvzone pulls in mediapipe (about a second), so it is imported on first
+    # use or preloaded in the background instead of at program start
+    from cvzone.FaceDetectionModule import FaceDetector
+    return FaceDetector
+
+
+def clip_box(box, width, height):
+    # Clip to the frame, KCF refuses boxes that leave the image
+    x, y, w, h = box
+    x, y = max(0, x), max(0, y)
+    return x, y, min(w, width - x), min(h, height - y)
+
 
 class Detector:
-    def __init__(self, control_servo):
-        self.detector = FaceDetector()
-        self.recognizer = Recognizer()
-        self.recognizer.load_model()
+    def __init__(self, control_servo, recognizer_backend="lbph", processing_width=640, expected_face_size=None,
+                 recognizer=None, sightings=None, camera=None):
+        self.detector = None  # cvzone FaceDetector, created by the first detection frame
+        # Cameras share one loaded recognizer, pass it in to avoid a model copy per Detector
+        if recognizer is None:
+            recognizer = Recognizer(backend=recognizer_backend)
+            recognizer.load_model()
+        self.recognizer = recognizer
         self.user_name = None
         self.register_mode = False
         self.model_has_been_trained = False
 
-        self.known_faces = {}
-        self.next_face_id = 0
-        self.trackers = {}
-        self.bounding_boxes = {}
-        self.unrecognized_start = {}
-        self.capture_in_progress = {}
-        self.capture_count = {}
-        self.current_user = {}
+        # Detection and KCF run on a downscaled frame, recognition crops come
+        # from the full-resolution one. With expected_face_size (px at full
+        # resolution) the scale is a pyramid level instead: halved while the
+        # face stays above MIN_DETECTION_FACE.
+        self.processing_width = processing_width
+        self.expected_face_size = expected_face_size
+        self.frame_width = self.frame_height = 0
+
+        # One record per tracked face, dropped after 45 missed frames or 3 s unseen
+        self.tracks = TrackStore(max_missed=45, max_age=3.0)
+
+        # Skip LBPH predict for tracked faces whose identity is still fresh
+        self.recognition_cache = RecognitionCache(interval=10, drift=0.25, growth=0.2, confidence_margin=0.15)
+        self.frame_index = 0
+
+        # Full detection every N frames (adaptive), KCF trackers in between
+        self.scheduler = DetectionScheduler(interval=5, min_interval=1, max_interval=15, frame_budget=1 / 30)
+        self.current_time = time.time()
+        self.last_results = []  # Per-face results of the last detect_faces call
+
+        # Per-stage timers and counters, cheap enough to stay on
+        self.metrics = FrameMetrics()
+
+        # Registration samples are written off the capture thread
+        self.sample_writer = SampleWriter(maxsize=32, archive=False)
+        self.sample_writer.start()
+        # Only sharp, whole, distinct crops are kept, up to 40 per user
+        self.sample_selector = SampleSelector(target=40, min_size=80, min_sharpness=40.0, min_score=0.8,
+                                              min_distance=6, max_frames=900,
+                                              preprocess=self.recognizer.preprocessor)
+        self.completed_registration = None  # User whose samples are already captured
+        self.on_registration_complete = None  # Called with (user_name, success) after the model swap
+        self.model_version = self.recognizer.model_version
+        self.label_map_reloads = self.recognizer.label_map_reloads
 
         self.control_servo = control_servo
 
+        # Optional sightings.SightingsLog (may be shared by several cameras):
+        # track start/end and identity changes, queued without blocking
+        self.sightings = sightings
+        self.camera = camera
+
     def train_model(self):
         self.recognizer.train_model()
         self.model_has_been_trained = True
@@ -36,8 +107,9 @@ class Detector:
         cv2.putText(img, label, (fx, fy - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
         
         if countdown:
-            if face_id is not None and face_id in self.unrecognized_start:
-                remaining_time = 30 - int(time.time() - self.unrecognized_start[face_id])
+            track = self.tracks.get(face_id) if face_id is not None else None
+            if track is not None:
+                remaining_time = 30 - int(self.current_time - track.unrecognized_start)
                 remaining_time = max(0, remaining_time)  # Prevent negative time
                 cv2.putText(img, f"Time to lock: {remaining_time}s",
                             (fx, fy + fh + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
@@ -45,119 +117,303 @@ class Detector:
                 cv2.putText(img, "Time to lock: N/A",
                             (fx, fy + fh + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
 
-    def detect_faces(self, img, register_mode=False, user_name=None):
-        self.recognizer.load_label_map()  # Reload JSON-based label map each time
+    def detect_faces(self, img, register_mode=False, user_name=None, timestamp=None):
+        # timestamp lets offline callers drive the clock (seconds), live use keeps wall time
+        self.current_time = time.time() if timestamp is None else timestamp
+        self.recognizer.refresh_label_map()  # Reload label map only if the file changed
+        if self.label_map_reloads != self.recognizer.label_map_reloads:
+            # Reloaded here or by another camera's Detector, cached names/types may be outdated
+            self.label_map_reloads = self.recognizer.label_map_reloads
+            self.recognition_cache.clear()
+        if self.model_version != self.recognizer.model_version:
+            # A retrained model was swapped in, re-recognize every track
+            self.model_version = self.recognizer.model_version
+            self.recognition_cache.clear()
+        if register_mode and user_name == self.completed_registration:
+            register_mode = False  # Capture already done, waiting for training
         self.register_mode = register_mode
         self.user_name = user_name
+        self.frame_index += 1
+
+        metrics = self.metrics
+        frame_start = time.perf_counter()
+        self.frame_height, self.frame_width = img.shape[:2]
+        scale = self.processing_scale(img.shape)
+        small = img if scale == 1.0 else cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+        stage_start = time.perf_counter()
+        metrics.add_time("downscale", stage_start - frame_start)
 
-        img, bboxs = self.detector.findFaces(img, draw=False)
-        if img is None:
-            return img, bboxs
+        detect = self.scheduler.should_detect()
+        if detect:
+            if self.detector is None:
+                self.detector = load_face_detector()()
+            small, bboxs = self.detector.findFaces(small, draw=False)
+            find_end = time.perf_counter()
+            metrics.add_time("find_faces", find_end - stage_start)
+            if small is None:
+                return small, bboxs
+            bboxs = [self.to_full_resolution(bbox, scale) for bbox in bboxs or []]
+            tracked = self.start_tracks(img, small, scale, bboxs)
+            metrics.add_time("tracker_init", time.perf_counter() - find_end)
+        else:
+            tracked = self.update_tracks(small, scale)
+            bboxs = [{"id": track.face_id, "bbox": track.bbox} for track in tracked]
+            metrics.add_time("tracker_update", time.perf_counter() - stage_start)
 
         ws, hs, _ = img.shape
-        current_time = time.time()
-
-        if bboxs:
-            for bbox in bboxs:
-                x, y, w, h = bbox["bbox"]
-                fx, fy, fw, fh = x, y, w, h
-                face_id = self.get_face_id(bbox)
-
-                if face_id not in self.trackers:
-                    tracker = cv2.TrackerKCF_create()
-                    tracker.init(img, (fx, fy, fw, fh))
-                    self.trackers[face_id] = tracker
-                    self.bounding_boxes[face_id] = (fx, fy, fw, fh)
-                    self.unrecognized_start[face_id] = current_time
-                    self.capture_in_progress[face_id] = False
-                    self.capture_count[face_id] = 0
-                    self.current_user[face_id] = None
-
-                success, updated_bbox = self.trackers[face_id].update(img)
-                if success:
-                    fx, fy, fw, fh = [int(v) for v in updated_bbox]
-                    self.bounding_boxes[face_id] = (fx, fy, fw, fh)
-
-                    face_img = img[fy:fy+fh, fx:fx+fw]
-                    recognized, user_label, user_type = self.recognizer.recognize_face(face_img)
-                    
-                    if recognized:
-                        if user_type == "Enemy":
-                            self.lock_target(img, fx, fy, ws, hs, face_id, "ENEMY")
-                        else:
-                            # Draw green box for users
-                            color = (0, 255, 0)  # Green
-                            self.draw_bounding_box(img, fx, fy, fw, fh, color, str(user_label))
-                        
-                        self.current_user[face_id] = user_label
-                        self.unrecognized_start[face_id] = current_time
-                    else:
-                        elapsed = current_time - self.unrecognized_start[face_id]
-                        if not self.register_mode:
-                            if elapsed > 30:
-                                self.lock_target(img, fx, fy, ws, hs, face_id, "ENEMY")
-                            else:
-                                self.draw_bounding_box(img, fx, fy, fw, fh, (0, 255, 255), "UNKNOWN", countdown=True, face_id=face_id)
-                    
-                    if self.register_mode and self.user_name:
-                        self.capture_face(img, face_id, face_img, fx, fy, fw, fh)
-                else:
-                    continue
+        current_time = self.current_time
+
+        # Recognize before drawing so the crops are clean
+        stage_start = time.perf_counter()
+        results = self.recognize_tracks(img, tracked)
+        draw_start = time.perf_counter()
+        metrics.add_time("recognize", draw_start - stage_start)
+
+        self.last_results = []
+        for track, result in zip(tracked, results):
+            self.update_identity(track, result)
+            self.process_face(img, track, result, ws, hs, current_time)
+            recognized, name, user_type, confidence = result
+            self.last_results.append({"face_id": track.face_id, "bbox": list(track.bbox), "recognized": recognized,
+                                      "name": name, "type": user_type, "confidence": confidence})
 
+        for track in self.tracks.expire(current_time, self.frame_index):
+            self.recognition_cache.discard(track.face_id)
+            self.log_track_end(track)
+        frame_end = time.perf_counter()
+        metrics.add_time("draw", frame_end - draw_start)
+        metrics.add_time("detect_faces", frame_end - frame_start)
+
+        metrics.count("frames")
+        metrics.count("detection_frames" if detect else "tracking_frames")
+        metrics.gauge("active_tracks", len(tracked))
+        metrics.gauge("tracks", self.tracks.stats())
+        metrics.gauge("detect_interval", self.scheduler.interval)
+        metrics.gauge("recognition_cache", self.recognition_cache.stats())
+        if self.sightings is not None:
+            metrics.gauge("sightings", self.sightings.stats())
+
+        self.scheduler.record(detect, frame_end - frame_start)
         return img, bboxs
 
-    def get_face_id(self, bbox):
-        x, y, w, h = bbox["bbox"]
-        center = (x + w // 2, y + h // 2)
-        for face_id, (fx, fy, fw, fh) in self.bounding_boxes.items():
-            existing_center = (fx + fw // 2, fy + fh // 2)
-            distance = np.linalg.norm(np.array(center) - np.array(existing_center))
-            if distance < 50:
-                return face_id
-        face_id = self.next_face_id
-        self.next_face_id += 1
-        return face_id
+    def processing_scale(self, shape):
+        height, width = shape[:2]
+        if self.expected_face_size:
+            scale = 1.0
+            while self.expected_face_size * scale / 2 >= MIN_DETECTION_FACE:
+                scale /= 2
+            return scale
+        if self.processing_width and width > self.processing_width:
+            return self.processing_width / width
+        return 1.0
+
+    def to_full_resolution(self, bbox, scale):
+        if scale == 1.0:
+            return bbox
+        mapped = dict(bbox)
+        mapped["bbox"] = scale_box(bbox["bbox"], 1 / scale)
+        if "center" in bbox:
+            mapped["center"] = scale_box(bbox["center"], 1 / scale)
+        return mapped
+
+    def start_tracks(self, img, small, scale, bboxs):
+        # Detection frame: match detections to known faces and re-seed their
+        # trackers from the fresh boxes. Boxes are full resolution, the
+        # trackers run on the processing frame.
+        current_time = self.current_time
+        img_h, img_w = img.shape[:2]
+        small_h, small_w = small.shape[:2]
+        boxes, scores = [], []
+        for bbox in bboxs:
+            box = clip_box(bbox["bbox"], img_w, img_h)
+            if box[2] > 0 and box[3] > 0:
+                boxes.append(box)
+                score = bbox.get("score")
+                scores.append(score[0] if isinstance(score, (list, tuple)) else score)
+
+        tracked = []
+        for face_id, box, score in zip(self.tracks.match(boxes), boxes, scores):
+            small_box = clip_box(tracker_box(box, scale), small_w, small_h)
+            if small_box[2] <= 0 or small_box[3] <= 0:
+                continue
+            track = self.tracks.get(face_id)
+            if track is None:
+                track = self.tracks.create(face_id, box, current_time, self.frame_index)
+                if self.sightings is not None:
+                    self.sightings.record(current_time, self.camera, "start", face_id, bbox=box)
+
+            track.tracker = cv2.TrackerKCF_create()
+            track.tracker.init(small, small_box)
+            track.score = score
+            self.tracks.seen(track, box, current_time, self.frame_index)
+            tracked.append(track)
+        return tracked
+
+    def update_tracks(self, small, scale):
+        # Tracking frame: only the tracks carried through the previous frame
+        # are updated. A lost track triggers a detection next frame.
+        tracked = []
+        for track in list(self.tracks.values()):
+            if track.last_frame != self.frame_index - 1:
+                continue
+            success, updated_bbox = track.tracker.update(small)
+            if not success:
+                self.scheduler.request_detection()
+                continue
+            x, y, w, h = updated_bbox
+            _, _, fw, fh = track.bbox
+            cx, cy = (x + w / 2) / scale, (y + h / 2) / scale
+            bbox = clip_box((int(round(cx - fw / 2)), int(round(cy - fh / 2)), fw, fh),
+                            self.frame_width, self.frame_height)
+            if bbox[2] <= 0 or bbox[3] <= 0:
+                continue
+            self.tracks.seen(track, bbox, self.current_time, self.frame_index)
+            tracked.append(track)
+        return tracked
+
+    def recognize_tracks(self, img, tracked):
+        # Cached identities where still fresh, one batched call for the rest
+        results = [None] * len(tracked)
+        misses = []
+        for i, track in enumerate(tracked):
+            results[i] = self.recognition_cache.lookup(track.face_id, track.bbox, self.frame_index,
+                                                       self.recognizer.confidence_threshold)
+            if results[i] is None:
+                misses.append(i)
+
+        if misses:
+            batch = self.recognizer.recognize_faces(img, [tracked[i].bbox for i in misses], metrics=self.metrics)
+            for i, result in zip(misses, batch):
+                track = tracked[i]
+                self.recognition_cache.store(track.face_id, track.bbox, self.frame_index, result)
+                results[i] = result
+        return results
+
+    def update_identity(self, track, result):
+        # Logs a sighting when a track is recognized as someone new, and
+        # keeps the best match distance for the track's end record
+        recognized, name, user_type, confidence = result
+        if not recognized:
+            return
+        if name != track.current_user:
+            track.current_type = user_type
+            track.best_confidence = confidence
+            if self.sightings is not None:
+                self.sightings.record(self.current_time, self.camera, "identity", track.face_id, name, user_type,
+                                      confidence, track.bbox)
+        elif track.best_confidence is None or confidence < track.best_confidence:
+            track.best_confidence = confidence
+
+    def log_track_end(self, track):
+        if self.sightings is not None:
+            self.sightings.record(track.last_seen, self.camera, "end", track.face_id, track.current_user,
+                                  track.current_type, track.best_confidence, track.bbox,
+                                  duration=track.last_seen - track.first_seen)
+
+    def reset(self):
+        # Forgets every track and cached identity, for sources whose frames
+        # are unrelated scenes (image folders): nothing may carry over, and
+        # with no tracks left the next frame has to run the detector
+        for track in self.tracks.clear():
+            self.log_track_end(track)
+        self.recognition_cache.clear()
+        self.scheduler.request_detection()
+
+    def flush_sightings(self):
+        # End records for every live track, at the end of a source or on shutdown
+        for track in list(self.tracks.values()):
+            self.log_track_end(track)
+
+    def process_face(self, img, track, result, ws, hs, current_time):
+        face_id = track.face_id
+        fx, fy, fw, fh = track.bbox
+        face_img = img[fy:fy+fh, fx:fx+fw]
+        if self.register_mode and self.user_name:
+            face_img = face_img.copy()  # Keep the sample free of the boxes drawn below
+        recognized, user_label, user_type, _ = result
+
+        if recognized:
+            if user_type == "Enemy":
+                self.lock_target(img, fx, fy, ws, hs, face_id, "ENEMY")
+            else:
+                # Draw green box for users
+                color = (0, 255, 0)  # Green
+                self.draw_bounding_box(img, fx, fy, fw, fh, color, str(user_label))
+
+            track.current_user = user_label
+            track.unrecognized_start = current_time
+        elif self.recognizer.model_state == "loading":
+            # Nobody can be recognized yet, hold the lock countdown until the model is live
+            track.unrecognized_start = current_time
+            if not self.register_mode:
+                self.draw_bounding_box(img, fx, fy, fw, fh, (200, 200, 200), "LOADING MODEL")
+        else:
+            elapsed = current_time - track.unrecognized_start
+            if not self.register_mode:
+                if elapsed > 30:
+                    self.lock_target(img, fx, fy, ws, hs, face_id, "ENEMY")
+                else:
+                    self.draw_bounding_box(img, fx, fy, fw, fh, (0, 255, 255), "UNKNOWN", countdown=True, face_id=face_id)
+
+        if self.register_mode and self.user_name:
+            self.capture_face(img, face_id, face_img, fx, fy, fw, fh)
 
     def lock_target(self, img, fx, fy, ws, hs, face_id, label):
-        cv2.circle(img, (fx + self.bounding_boxes[face_id][2] // 2,
-                        fy + self.bounding_boxes[face_id][3] // 2), 50, (0, 0, 255), 2)
+        _, _, bw, bh = self.tracks.get(face_id).bbox
+        cv2.circle(img, (fx + bw // 2,
+                        fy + bh // 2), 50, (0, 0, 255), 2)
         cv2.putText(img, label, (fx + 15, fy - 15),
                     cv2.FONT_HERSHEY_PLAIN, 2, (0, 0, 255), 2)
-        cv2.line(img, (0, fy + self.bounding_boxes[face_id][3] // 2),
-                 (hs, fy + self.bounding_boxes[face_id][3] // 2), (0, 0, 0), 2)
-        cv2.line(img, (fx + self.bounding_boxes[face_id][2] // 2, 0),
-                 (fx + self.bounding_boxes[face_id][2] // 2, ws), (0, 0, 0), 2)
-        cv2.circle(img, (fx + self.bounding_boxes[face_id][2] // 2,
-                        fy + self.bounding_boxes[face_id][3] // 2), 15, (0, 0, 255), cv2.FILLED)
+        cv2.line(img, (0, fy + bh // 2),
+                 (hs, fy + bh // 2), (0, 0, 0), 2)
+        cv2.line(img, (fx + bw // 2, 0),
+                 (fx + bw // 2, ws), (0, 0, 0), 2)
+        cv2.circle(img, (fx + bw // 2,
+                        fy + bh // 2), 15, (0, 0, 255), cv2.FILLED)
         cv2.putText(img, "TARGET LOCKED", (850, 50),
                     cv2.FONT_HERSHEY_PLAIN, 3, (255, 0, 255), 3)
 
         # Emit the target coordinates to ControlServo if active
         if self.control_servo and self.control_servo.active:
-            target_x = fx + self.bounding_boxes[face_id][2] // 2
-            target_y = fy + self.bounding_boxes[face_id][3] // 2
+            target_x = fx + bw // 2
+            target_y = fy + bh // 2
             self.control_servo.set_target_signal.emit(target_x, target_y, ws, hs)
 
     def capture_face(self, img, face_id, face_img, fx, fy, fw, fh):
-        import sys, os
-        if not self.capture_in_progress[face_id]:
-            self.capture_in_progress[face_id] = True
-            self.capture_count[face_id] = 0
-
-        if self.capture_count[face_id] < 100:
-            folder_name = f"dataset/{self.user_name}"
-            if not os.path.exists(folder_name):
-                os.makedirs(folder_name)
-            img_path = os.path.join(folder_name, f"{self.capture_count[face_id]}.jpg")
-            cv2.imwrite(img_path, face_img)
-            self.capture_count[face_id] += 1
-            # Update the bounding box with capture count
-            self.draw_bounding_box(img, fx, fy, fw, fh, (0, 0, 255), str(self.capture_count[face_id]))
-        else:
-            self.capture_in_progress[face_id] = False
-            self.capture_count[face_id] = 0
+        track = self.tracks.get(face_id)
+        selector = self.sample_selector
+        if not track.capture_in_progress:
+            track.capture_in_progress = True
+            track.capture_count = 0
+            selector.reset()
+            self.sample_writer.begin(f"dataset/{self.user_name}")
+
+        accepted, reason = selector.consider(face_img, (fx, fy, fw, fh), img.shape, track.score)
+        if accepted:
+            self.sample_writer.submit(track.capture_count, face_img)
+            track.capture_count += 1
+        # Show progress, and why the last crop was skipped so the user can adjust
+        label = f"{selector.accepted}/{selector.target}" + (f" {reason}" if reason else "")
+        self.draw_bounding_box(img, fx, fy, fw, fh, (0, 0, 255), label)
+
+        if selector.done:
+            track.capture_in_progress = False
+            track.capture_count = 0
             self.register_mode = False
-            self.recognizer.train_model()
-            print(f"Finished capturing for user: {self.user_name}")
-    
-            os.execl(sys.executable, sys.executable, *sys.argv)
\ No newline at end of file
+            self.completed_registration = self.user_name
+            print(f"Finished capturing for user: {self.user_name} {selector.stats()}")
+            # Train only once the writer has flushed every sample to disk
+            self.sample_writer.finish(self.on_samples_written)
+
+    def on_samples_written(self, folder, written):
+        print(f"Wrote {written} samples to {folder}")
+        user_name = self.completed_registration
+
+        def on_trained(success):
+            print(f"Model {'updated' if success else 'not updated'} for user: {user_name}")
+            if self.on_registration_complete:
+                self.on_registration_complete(user_name, success)
+
+        # Camera and trackers keep running while the new user is added to the model
+        if not self.recognizer.enroll_user_async(user_name, on_trained):
+            on_trained(False)
@@ -0,0 +1,174 @@
+# lbph.py
+# NumPy port of OpenCV's LBPHFaceRecognizer (opencv_contrib lbph_faces.cpp):
+# circular extended LBP with bilinear interpolation, per-cell histograms
+# normalized by the cell size, nearest neighbour under the alternative
+# chi-square distance. Histograms and distances match cv2.face exactly, so
+# models move freely between this port and OpenCV's YAML files.
+# compact_gallery() shrinks a gallery to a few k-medoid prototypes per user.
+import cv2
+import math
+import numpy as np
+
+BATCH_FACES = 256     # Faces coded at once, bounds the temporaries while training
+PARALLEL_ROWS = 512  # Gallery rows per parallel distance task
+
+
+def neighbour_weights(radius, neighbors):
+    # Sample offsets and interpolation weights, computed exactly like elbp_()
+    # (double trig, then float), including the tiny non-zero offsets cos/sin
+    # leave at multiples of pi/2
+    points = []
+    for n in range(neighbors):
+        angle = 2.0 * math.pi * n / float(neighbors)
+        x = np.float32(radius * math.cos(angle))
+        y = np.float32(-radius * math.sin(angle))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty, tx = np.float32(y - fy), np.float32(x - fx)
+        one = np.float32(1)
+        weights = ((one - tx) * (one - ty), tx * (one - ty), (one - tx) * ty, tx * ty)
+        points.append((fx, fy, cx, cy, weights))
+    return points
+
+
+def elbp(faces, radius=1, neighbors=8):
+    # faces: (N, H, W) uint8 of one size -> (N, H - 2r, W - 2r) int32 codes
+    faces = np.asarray(faces)
+    count, rows, cols = faces.shape
+    height, width = rows - 2 * radius, cols - 2 * radius
+    source = faces.astype(np.float32)
+    center = source[:, radius:radius + height, radius:radius + width]
+    codes = np.zeros((count, height, width), np.int32)
+    epsilon = np.finfo(np.float32).eps
+
+    def window(dy, dx):
+        return source[:, radius + dy:radius + dy + height, radius + dx:radius + dx + width]
+
+    for n, (fx, fy, cx, cy, (w1, w2, w3, w4)) in enumerate(neighbour_weights(radius, neighbors)):
+        t = w1 * window(fy, fx)
+        t += w2 * window(fy, cx)
+        t += w3 * window(cy, fx)
+        t += w4 * window(cy, cx)
+        codes |= ((t > center) | (np.abs(t - center) < epsilon)).astype(np.int32) << n
+    return codes
+
+
+def spatial_histograms(codes, neighbors=8, grid_x=8, grid_y=8):
+    # (N, H, W) codes -> (N, grid_x * grid_y * 2^neighbors) float32. Cells
+    # are H // grid_y by W // grid_x, leftover rows and columns are ignored.
+    count, rows, cols = codes.shape
+    patterns = 1 << neighbors
+    height, width = rows // grid_y, cols // grid_x
+    cells = codes[:, :grid_y * height, :grid_x * width]
+    cells = cells.reshape(count, grid_y, height, grid_x, width).transpose(0, 1, 3, 2, 4)
+    cells = cells.reshape(count, grid_y * grid_x, height * width)
+
+    # One bincount over (face, cell, pattern) ids for the whole batch
+    offsets = (np.arange(count * grid_y * grid_x, dtype=np.int64) * patterns).reshape(count, -1, 1)
+    counts = np.bincount((cells + offsets).ravel(), minlength=count * grid_y * grid_x * patterns)
+    # histc(normed=true) scales in float by the float of 1.0 / cell size
+    return counts.reshape(count, -1).astype(np.float32) * np.float32(1.0 / (height * width))
+
+
+def compute_histograms(faces, radius=1, neighbors=8, grid_x=8, grid_y=8):
+    # List of grayscale faces of any sizes -> (N, D) float32, in input order
+    faces = list(faces)
+    dimension = grid_x * grid_y * (1 << neighbors)
+    histograms = np.empty((len(faces), dimension), np.float32)
+    by_shape = {}
+    for i, face in enumerate(faces):
+        by_shape.setdefault(face.shape, []).append(i)
+    for indexes in by_shape.values():
+        for start in range(0, len(indexes), BATCH_FACES):
+            rows = indexes[start:start + BATCH_FACES]
+            batch = np.stack([faces[i] for i in rows])
+            histograms[rows] = spatial_histograms(elbp(batch, radius, neighbors), neighbors, grid_x, grid_y)
+    return histograms
+
+
+def chi_square_alt(gallery, probe, executor=None):
+    # OpenCV's HISTCMP_CHISQR_ALT of every gallery row against one probe.
+    # cv2.compareHist is the routine cv2.face uses itself (exact, in double)
+    # and releases the GIL, so chunks of a large gallery run in parallel.
+    count = len(gallery)
+    distances = np.empty(count, np.float64)
+
+    def score(start, stop):
+        for row in range(start, stop):
+            distances[row] = cv2.compareHist(gallery[row], probe, cv2.HISTCMP_CHISQR_ALT)
+
+    if executor is None or count < 2 * PARALLEL_ROWS:
+        score(0, count)
+    else:
+        chunks = [(start, min(count, start + PARALLEL_ROWS)) for start in range(0, count, PARALLEL_ROWS)]
+        list(executor.map(lambda chunk: score(*chunk), chunks))
+    return distances
+
+
+def nearest(gallery, labels, probe, executor=None):
+    # (label, distance) of the closest gallery histogram, the first one on ties
+    if len(labels) == 0:
+        return -1, float(np.finfo(np.float64).max)
+    distances = chi_square_alt(gallery, probe, executor)
+    row = int(distances.argmin())
+    return int(labels[row]), float(distances[row])
+
+
+def pairwise_chi_square(histograms):
+    # Symmetric (N, N) matrix of chi_square_alt between every pair of rows
+    count = len(histograms)
+    distances = np.zeros((count, count), np.float64)
+    for i in range(count):
+        for j in range(i + 1, count):
+            distances[i, j] = distances[j, i] = cv2.compareHist(histograms[i], histograms[j],
+                                                                cv2.HISTCMP_CHISQR_ALT)
+    return distances
+
+
+def k_medoids(distances, k, iterations=30, seed=0):
+    # Row indexes (sorted) of k medoids for a precomputed distance matrix.
+    # Seeded k-medoids++ from the most central row, then alternating
+    # assignment and medoid update until the medoids stop changing.
+    count = len(distances)
+    if count <= k:
+        return np.arange(count)
+    rng = np.random.default_rng(seed)
+    medoids = [int(distances.sum(axis=1).argmin())]
+    closest = distances[medoids[0]].copy()
+    while len(medoids) < k:
+        weights = closest ** 2
+        if weights.sum() <= 0:
+            break  # Every remaining row duplicates a medoid
+        pick = int(rng.choice(count, p=weights / weights.sum()))
+        medoids.append(pick)
+        closest = np.minimum(closest, distances[pick])
+    medoids = np.array(medoids)
+
+    for _ in range(iterations):
+        assignment = distances[:, medoids].argmin(axis=1)
+        updated = medoids.copy()
+        for cluster in range(len(medoids)):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members):
+                updated[cluster] = members[distances[np.ix_(members, members)].sum(axis=1).argmin()]
+        if np.array_equal(np.sort(updated), np.sort(medoids)):
+            break
+        medoids = updated
+    return np.sort(medoids)
+
+
+def compact_gallery(histograms, labels, prototypes, executor=None):
+    # Keeps `prototypes` medoid histograms per label (all of them for labels
+    # with fewer samples). Rows stay in their original order.
+    labels = np.asarray(labels)
+    users = np.unique(labels)
+
+    def user_rows(user):
+        rows = np.flatnonzero(labels == user)
+        if len(rows) <= prototypes:
+            return rows
+        return rows[k_medoids(pairwise_chi_square(histograms[rows]), prototypes)]
+
+    kept = list(executor.map(user_rows, users)) if executor is not None else [user_rows(u) for u in users]
+    kept = np.sort(np.concatenate(kept)) if kept else np.empty(0, np.int64)
+    return np.ascontiguousarray(histograms[kept], np.float32), labels[kept].astype(np.int32)
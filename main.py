@@ -1,23 +1,57 @@
 # main.py
+import os
 import sys
+import time
+import threading
+from metrics import StartupTimer
+
+# STARTUP_TIMING=1 prints the time of each startup phase once the window is
+# up and the model is live, STARTUP_TIMING=exit also quits right after
+STARTUP_TIMING = os.environ.get("STARTUP_TIMING", "")
+startup = StartupTimer()
+
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget
-from PyQt5.QtCore import QThread, pyqtSignal, Qt
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal, Qt
 from PyQt5.QtGui import QPixmap, QImage, QStandardItem, QStandardItemModel
-from main_ui import Ui_MainWindow
-from detector import Detector
-from control_servo import ControlServo
+startup.mark("import PyQt5")
 import cv2
 import numpy as np
-import pandas as pd
-import os
-import time
-import recognizer
+startup.mark("import OpenCV, NumPy")
+from main_ui import Ui_MainWindow
+from detector import Detector, load_face_detector
+from control_servo import ControlServo
+from recognizer import Recognizer
 from resigter_user import Ui_RegisterWindow
+from metrics import StageMetrics, MetricsReporter, draw_overlay
+from pipeline import DisplayBuffers, DropOldestQueue, FrameGrabber
+from user_registry import COLUMNS, get_registry
+from sightings import SightingsLog
+startup.mark("import app modules")
+
+# Qt 5.14+ takes OpenCV's BGR layout as is, older builds get RGB from the worker
+QIMAGE_BGR888 = getattr(QImage, "Format_BGR888", None)
+
+VIDEO_SIZE = (800, 600)  # Area of the video view, split into a grid for several cameras
+
+
+def parse_sources(value):
+    # CAMERAS="0,1,entrance.mp4,rtsp://..." -> [0, 1, "entrance.mp4", "rtsp://..."]
+    sources = [item.strip() for item in value.split(",") if item.strip()]
+    return [int(item) if item.isdigit() else item for item in sources] or [0]
+
+
+def grid_shape(count):
+    columns = int(np.ceil(np.sqrt(count)))
+    return int(np.ceil(count / columns)), columns
 
-recognizer = recognizer.Recognizer()
 
 class MainWindow(QMainWindow):
+    # Emitted from the training thread once a registration is in the model
+    registration_done_signal = pyqtSignal(str, bool)
+    # Emitted from the loading thread once the startup model load is over
+    model_loaded_signal = pyqtSignal(bool)
+
     def __init__(self):
         super(MainWindow, self).__init__()
         self.centralWidget = QWidget()
@@ -31,22 +65,128 @@ class MainWindow(QMainWindow):
         self.uic.stopBtn.clicked.connect(self.stop_camera)
         self.uic.deleteBtn.clicked.connect(self.user_to_enemy)
 
-        # Instantiate ControlServo with optional port
+        # Users live in users.db, imported once from users.xlsx if needed
+        self.registry = get_registry()
+
+        # Startup phases still running in the background, reported when all are over
+        self.startup_pending = {"window", "model", "servo"}
+
+        # Instantiate ControlServo with optional port. The board is probed
+        # on the servo thread, the status arrives through the signal.
         self.control_servo = ControlServo(port='COM4')
         self.control_servo.connection_status_signal.connect(self.handle_servo_connection_status)
+        self.servo_started = startup.now()
         self.control_servo.start()
 
-        # Instantiate Detector with ControlServo
-        self.detector = Detector(self.control_servo)
-
-        # Pass the detector to CaptureVideo
-        self.camera_thread = CaptureVideo(self, self.detector)
-        self.camera_thread.signal.connect(self.show_webcam)
+        # One recognizer (one model in memory) shared by every camera. The
+        # model loads in the background, faces show "LOADING MODEL" until then.
+        self.recognizer = Recognizer()
+        self.model_load_started = startup.now()
+        self.model_loaded_signal.connect(self.finish_model_load)
+        self.recognizer.load_model_async(callback=self.model_loaded_signal.emit)
+
+        # CAMERAS=<index|file|url>,... selects the sources, default camera 0.
+        # Each source gets its own Detector (trackers, cache, metrics) and
+        # worker thread. The first camera drives the servo and registration.
+        self.sources = parse_sources(os.environ.get("CAMERAS", "0"))
+        if len(self.sources) > 1:
+            # Each camera has its own worker thread, split OpenCV's internal
+            # threads between them instead of every worker using all cores
+            cv2.setNumThreads(max(1, (os.cpu_count() or 1) // len(self.sources)))
+        # Who was seen when, on which camera and track: sightings/<day>.db
+        self.sightings = SightingsLog(os.environ.get("SIGHTINGS_DIR", "sightings"))
+        self.sightings.start()
+        self.detectors = [Detector(self.control_servo if i == 0 else None, recognizer=self.recognizer,
+                                   sightings=self.sightings, camera=str(i))
+                          for i in range(len(self.sources))]
+        self.detector = self.detectors[0]
+        self.detector.on_registration_complete = self.registration_done_signal.emit
+        self.registration_done_signal.connect(self.finish_register)
+
+        # Pass the detectors to CaptureVideo. METRICS_PORT=<port> serves the
+        # frame metrics of the first camera as JSON on localhost.
+        metrics_port = int(os.environ.get("METRICS_PORT", "0")) or None
+        self.video_labels = self.create_video_grid(len(self.sources))
+        tile_size = (self.video_labels[0].width(), self.video_labels[0].height())
+        self.camera_threads = [CaptureVideo(self, detector, source=source, camera_index=i,
+                                            metrics_port=metrics_port if i == 0 else None,
+                                            display_size=tile_size, registration=(i == 0))
+                               for i, (source, detector) in enumerate(zip(self.sources, self.detectors))]
+        for camera_thread in self.camera_threads:
+            camera_thread.signal.connect(self.show_webcam)
+            camera_thread.status_signal.connect(self.uic.logBox.append)
+        self.camera_thread = self.camera_threads[0]
+
+        # Repaint at most once per display refresh, extra frames are dropped
+        # in the render queue instead of queuing up on the GUI thread
+        screen = QApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen is not None else 0
+        self.render_interval = 1.0 / (refresh_rate if refresh_rate > 0 else 60.0)
+        self.next_render = [0.0] * len(self.camera_threads)
+        self.render_pending = [False] * len(self.camera_threads)
+
+        # Initialize a flag to indicate servo availability, set by the connection status
+        self.servo_available = False
+        self.uic.logBox.append("Loading face model...")
+
+    def window_shown(self):
+        # First pass of the event loop after show(): the window is on screen
+        startup.mark("window shown")
+        # cvzone/mediapipe are only needed once a camera starts, import them now
+        # off the GUI thread so the first detection frame does not wait for them
+        threading.Thread(target=self.preload_face_detector, daemon=True).start()
+        self.startup_phase_done("window")
+
+    def preload_face_detector(self):
+        started = startup.now()
+        try:
+            load_face_detector()
+            startup.span("import face detector", started)
+        except Exception as e:
+            print(f"Face detector preload failed: {e}")
+
+    def finish_model_load(self, success):
+        startup.span("model load", self.model_load_started)
+        if success:
+            self.uic.logBox.append(f"Face model loaded from {self.recognizer.model_path}.")
+        elif self.recognizer.model_state == "missing":
+            self.uic.logBox.append("No face model yet, register a user to train one.")
+        else:
+            self.uic.logBox.append("Face model could not be loaded.")
+        self.startup_phase_done("model")
 
-        # Initialize a flag to indicate servo availability
-        self.servo_available = self.control_servo.active
+    def startup_phase_done(self, phase):
+        self.startup_pending.discard(phase)
+        if self.startup_pending or not STARTUP_TIMING:
+            return
+        print("Startup timing:")
+        print(startup.report())
+        if STARTUP_TIMING == "exit":
+            QApplication.quit()
+
+    def create_video_grid(self, count):
+        # A single camera uses the designer's label, several share its area
+        if count == 1:
+            return [self.uic.videoCamera]
+        geometry = self.uic.videoCamera.geometry()
+        self.uic.videoCamera.hide()
+        rows, columns = grid_shape(count)
+        width, height = VIDEO_SIZE[0] // columns, VIDEO_SIZE[1] // rows
+        labels = []
+        for i in range(count):
+            row, column = divmod(i, columns)
+            label = QtWidgets.QLabel(parent=self.uic.centralwidget)
+            label.setGeometry(geometry.x() + column * width, geometry.y() + row * height, width, height)
+            label.setStyleSheet("background-color: rgb(255, 255, 255);")
+            label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            label.show()
+            labels.append(label)
+        return labels
 
     def handle_servo_connection_status(self, success, message):
+        if "servo" in self.startup_pending:
+            startup.span("servo probe", self.servo_started)
+            self.startup_phase_done("servo")
         if success:
             self.uic.logBox.append(f"Servo Control: {message}")
             self.servo_available = True
@@ -55,51 +195,63 @@ class MainWindow(QMainWindow):
             self.servo_available = False
 
     def start_camera(self):
-        self.uic.logBox.append('Start camera')
+        self.uic.logBox.append(f"Start camera: {', '.join(str(source) for source in self.sources)}")
         # Start camera 
-        if not self.camera_thread.isRunning():
-            self.camera_thread.start()
+        for camera_thread in self.camera_threads:
+            if not camera_thread.isRunning():
+                camera_thread.start()
         self.loadUsersToTable()  # Example call to display the table
 
-    def show_webcam(self, cv_img):
+    def show_webcam(self, index=0):
+        # Renderer stage: always draw the newest processed frame of camera `index`
+        wait = self.next_render[index] - time.perf_counter()
+        if wait > 0:
+            # Too soon for the display, draw whatever is newest when it is due
+            if not self.render_pending[index]:
+                self.render_pending[index] = True
+                QTimer.singleShot(int(wait * 1000) + 1, lambda: self.render_due(index))
+            return
+        camera_thread = self.camera_threads[index]
+        item = camera_thread.take_frame()
+        if item is None:
+            return
+        captured_at, cv_img = item
+        start = time.perf_counter()
         qt_img = self.convert_cv_qt(cv_img)
-        self.uic.videoCamera.setPixmap(qt_img)
+        convert_end = time.perf_counter()
+        self.video_labels[index].setPixmap(qt_img)
+        end = time.perf_counter()
+        camera_thread.detector.metrics.add_time("qt_convert", convert_end - start)
+        camera_thread.detector.metrics.add_time("set_pixmap", end - convert_end)
+        camera_thread.metrics["render"].record(end - start)
+        camera_thread.metrics["latency"].record(end - captured_at)
+        self.next_render[index] = end + self.render_interval
+
+    def render_due(self, index):
+        self.render_pending[index] = False
+        self.show_webcam(index)
 
     def convert_cv_qt(self, cv_img):
-        rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
+        # cv_img is already display-sized (DisplayBuffers in the worker), the
+        # QImage wraps its memory and fromImage makes the only copy
+        h, w, ch = cv_img.shape
         bytes_per_line = ch * w
-        convert_to_Qt_format = QImage(rgb_image.data,
-                                      w,
-                                      h,
-                                      bytes_per_line,
-                                      QImage.Format.Format_RGB888)  # Updated format
-        p = convert_to_Qt_format.scaled(800, 600, Qt.AspectRatioMode.KeepAspectRatio)
-        return QPixmap.fromImage(p)
+        image_format = QIMAGE_BGR888 if QIMAGE_BGR888 is not None else QImage.Format.Format_RGB888
+        convert_to_Qt_format = QImage(cv_img.data, w, h, bytes_per_line, image_format)
+        return QPixmap.fromImage(convert_to_Qt_format)
 
     def stop_camera(self):
-        os.execl(sys.executable, sys.executable, *sys.argv)
+        # Stop the capture threads in place, start_camera can open them again
+        for camera_thread in self.camera_threads:
+            if camera_thread.isRunning():
+                camera_thread.stop()
+                self.uic.logBox.append(f"Camera {camera_thread.source}: {camera_thread.fps:.1f} fps")
+        self.uic.logBox.append('Stop camera')
 
     def user_to_enemy(self):
-        # Define file paths
-        users_file = "users.xlsx"
-
-        # Ensure users.xlsx exists; if not, create it with appropriate headers
-        if not os.path.exists(users_file):
-            df_users = pd.DataFrame(columns=["Name", "Sex", "RegisterTime", "Type"])
-            df_users.to_excel(users_file, index=False)
-            self.uic.logBox.append("Created users.xlsx as it did not exist.")
-        else:
-            df_users = pd.read_excel(users_file)
-            # Ensure 'Type' column exists
-            if 'Type' not in df_users.columns:
-                df_users['Type'] = 'User'
-                df_users.to_excel(users_file, index=False)
-                self.uic.logBox.append("Added 'Type' column to users.xlsx.")
-
-        df_users = pd.read_excel(users_file)
+        users = self.registry.all_users()
 
-        if df_users.empty:
+        if not users:
             self.uic.logBox.append("No users available to move to the enemy list.")
             return
 
@@ -107,22 +259,21 @@ class MainWindow(QMainWindow):
         row_indexes = [idx.row() for idx in selected_rows]
 
         if not row_indexes:
-            user_to_move = df_users.iloc[-1]
-            user_to_move['Type'] = 'Enemy'
+            user_to_move = users[-1]
+            self.registry.set_type([user_to_move["id"]], "Enemy")
             self.uic.logBox.append(f"Moved last user to enemy list: {user_to_move['Name']}")
-            df_users.iloc[-1] = user_to_move
         else:
-            users_moved = df_users.loc[row_indexes, 'Name'].tolist()
-            df_users.loc[row_indexes, 'Type'] = 'Enemy'
+            # Table rows are shown in registry order
+            user_ids = [users[row]["id"] for row in row_indexes if row < len(users)]
+            users_moved = self.registry.set_type(user_ids, "Enemy")
             self.uic.logBox.append(f"Moved selected users to enemy: {', '.join(users_moved)}")
 
-        # Save the updated DataFrames back to Excel
-        df_users.to_excel(users_file, index=False)
-
-        # Update the label map to include the new enemies
-        recognizer.save_label_map()
-        recognizer.load_label_map()  # Reload so detector sees the new Enemy type
+        # Update the label map to include the new enemies. The shared
+        # recognizer keeps the map in memory, so write through it directly.
+        self.recognizer.save_label_map()
+        stats = self.recognizer.label_map_stats()
         self.uic.logBox.append("Updated label with new enemy entries.")
+        self.uic.logBox.append(f"Label map reloads: {stats['reloads']} over {stats['frames']} frames")
 
         # Reload the user table in the UI
         self.loadUsersToTable()
@@ -131,12 +282,21 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         # Ensure threads are properly closed when the application exits
         self.control_servo.stop()
-        if self.camera_thread.isRunning():
-            self.camera_thread.stop()
-            self.camera_thread.wait()
+        for camera_thread in self.camera_threads:
+            if camera_thread.isRunning():
+                camera_thread.stop()
+                camera_thread.wait()
+        # Close the open tracks and write everything still queued
+        for detector in self.detectors:
+            detector.flush_sightings()
+        self.sightings.stop()
         event.accept()
 
     def keyPressEvent(self, event):
+        if event.text() == 'm':
+            # Toggle the stage timing overlay on the video
+            for camera_thread in self.camera_threads:
+                camera_thread.overlay = not camera_thread.overlay
         if event.text() == 'a':
             self.register_win = QtWidgets.QMainWindow()
             self.register_ui = Ui_RegisterWindow()
@@ -149,22 +309,24 @@ class MainWindow(QMainWindow):
         self.user_to_register = folder_name
         self.register_mode = True
 
-    def loadUsersToTable(self):
-        users_file = "users.xlsx"
-
-        if not os.path.exists(users_file):
-            df_users = pd.DataFrame(columns=["Name", "Sex", "RegisterTime", "Type"])
-            df_users.to_excel(users_file, index=False)
-            self.uic.logBox.append("Created users.xlsx.")
+    def finish_register(self, user_name, success):
+        self.register_mode = False
+        self.user_to_register = None
+        if success:
+            self.uic.logBox.append(f"Registered {user_name}, new model is live.")
         else:
-            df_users = pd.read_excel(users_file)
+            self.uic.logBox.append(f"Training failed for {user_name}.")
+        self.loadUsersToTable()
+
+    def loadUsersToTable(self):
+        users = self.registry.all_users()
 
         model = QStandardItemModel()
-        if not df_users.empty:
-            model.setHorizontalHeaderLabels(df_users.columns.tolist())
-            for row in range(df_users.shape[0]):
-                for col in range(df_users.shape[1]):
-                    item = QStandardItem(str(df_users.iat[row, col]))
+        if users:
+            model.setHorizontalHeaderLabels(COLUMNS)
+            for row, user in enumerate(users):
+                for col, column in enumerate(COLUMNS):
+                    item = QStandardItem(str(user[column]))
                     model.setItem(row, col, item)
 
         self.uic.infoTable.setModel(model)
@@ -174,43 +336,147 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         # Ensure threads are properly closed when the application exits
         self.control_servo.stop()
-        if self.camera_thread.isRunning():
-            self.camera_thread.stop()
-            self.camera_thread.wait()
+        for camera_thread in self.camera_threads:
+            if camera_thread.isRunning():
+                camera_thread.stop()
+                camera_thread.wait()
+        # Close the open tracks and write everything still queued
+        for detector in self.detectors:
+            detector.flush_sightings()
+        self.sightings.stop()
         event.accept()
 
 
 
 
 class CaptureVideo(QThread):
-    signal = pyqtSignal(np.ndarray)
+    # Emitted with the camera index when a processed frame is waiting in the render queue
+    signal = pyqtSignal(int)
+    # Messages for the GUI log, e.g. the end of a video file
+    status_signal = pyqtSignal(str)
 
-    def __init__(self, parent, detector):
+    def __init__(self, parent, detector, source=0, camera_index=0, metrics_port=None, metrics_interval=10.0,
+                 display_size=VIDEO_SIZE, registration=True):
         super(CaptureVideo, self).__init__(parent)
         self.parent = parent
         self.detector = detector
-        self.camera = cv2.VideoCapture(0)
+        self.source = source  # Camera index, video file or stream URL
+        self.camera_index = camera_index
+        self.registration = registration  # Only one camera captures registration samples
+        self.camera = None  # Opened by run(), opening a device can take seconds
+        # Video files play at their own frame rate, LOOP_VIDEO=1 restarts them at the end
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        self.loop = os.environ.get("LOOP_VIDEO", "") == "1"
         self.running = True
+        self.fps = 0.0
+
+        # Stage timings from the detector plus the pipeline queues, logged
+        # periodically and optionally served on a local port
+        self.reporter = MetricsReporter(detector.metrics, interval=metrics_interval, port=metrics_port,
+                                        extra=lambda: {"pipeline": self.pipeline_stats()},
+                                        name=f"camera {camera_index}")
+        self.overlay = False  # Draw the stage timings on the video
+        self.overlay_lines = []
+        self.overlay_refresh = 0.0
+
+        # grab -> process -> render, each hand-off keeps only the newest frame
+        self.metrics = {
+            "grab": StageMetrics("grab"),
+            "process": StageMetrics("process"),
+            "render": StageMetrics("render"),
+            "latency": StageMetrics("latency"),  # camera read to frame on screen
+        }
+        self.frame_queue = DropOldestQueue(maxsize=1, metrics=self.metrics["process"])
+        self.render_queue = DropOldestQueue(maxsize=1, metrics=self.metrics["render"])
+        self.grabber = None
+        # Frames are resized for their video tile here, off the GUI thread
+        self.display_buffers = DisplayBuffers(size=display_size, rgb=QIMAGE_BGR888 is None)
 
     def run(self):
+        self.running = True
+        if self.camera is None:
+            self.camera = cv2.VideoCapture(self.source)
+        elif not self.camera.isOpened():
+            self.camera.open(self.source)  # Released by a previous stop()
+        if self.is_file:
+            self.camera.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Play from the start again after an end
+        self.frame_queue.clear()
+        self.render_queue.clear()
+        self.grabber = FrameGrabber(self.camera, self.frame_queue, self.metrics["grab"], is_file=self.is_file,
+                                    loop=self.loop)
+        self.grabber.start()
+        if self.reporter.ident is None:
+            self.reporter.start()
+        frame_metrics = self.detector.metrics
+        fps_start, fps_frames = time.perf_counter(), 0
         while self.running:
-            ret, frame = self.camera.read()
-            if ret:
-                copy_frame = frame.copy()
-                register_mode = getattr(self.parent, "register_mode", False)
-                user_name = getattr(self.parent, "user_to_register", None)
-                processed_frame, bboxs = self.detector.detect_faces(copy_frame, register_mode, user_name)
-                self.signal.emit(processed_frame)
-            # Optional: Add a small sleep to reduce CPU usage
-            time.sleep(0.02)
+            item = self.frame_queue.get(timeout=0.1)
+            if item is None:
+                if not self.grabber.is_alive():
+                    break  # End of a video file, every frame is processed
+                continue
+            captured_at, frame = item
+            start = time.perf_counter()
+            frame_metrics.add_time("queue_wait", start - captured_at)
+            register_mode = self.registration and getattr(self.parent, "register_mode", False)
+            user_name = getattr(self.parent, "user_to_register", None) if self.registration else None
+            # The grabber hands over a fresh array every read, no copy needed
+            processed_frame, bboxs = self.detector.detect_faces(frame, register_mode, user_name)
+            self.metrics["process"].record(time.perf_counter() - start)
+            if processed_frame is None:
+                continue
+            if self.overlay:
+                self.draw_metrics(processed_frame)
+
+            emit_start = time.perf_counter()
+            display_frame = self.display_buffers.fit(processed_frame)
+            resize_end = time.perf_counter()
+            frame_metrics.add_time("display_resize", resize_end - emit_start)
+            if self.render_queue.put((captured_at, display_frame)):
+                self.signal.emit(self.camera_index)
+            frame_metrics.add_time("emit", time.perf_counter() - resize_end)
+            frame_metrics.gauge("dropped_frames", self.metrics["process"].dropped)
+            frame_metrics.gauge("dropped_renders", self.metrics["render"].dropped)
+
+            fps_frames += 1
+            elapsed = time.perf_counter() - fps_start
+            if elapsed >= 1.0:
+                self.fps = fps_frames / elapsed
+                frame_metrics.gauge("fps", round(self.fps, 1))
+                fps_start, fps_frames = time.perf_counter(), 0
+        self.grabber.stop()
+        if self.grabber.ended:
+            self.running = False
+            self.status_signal.emit(f"Camera {self.camera_index}: end of {self.source}")
+
+    def draw_metrics(self, frame):
+        # The text is refreshed twice a second, drawing it is the only per-frame cost
+        now = time.monotonic()
+        if now >= self.overlay_refresh:
+            self.overlay_lines = self.detector.metrics.overlay_lines()
+            self.overlay_refresh = now + 0.5
+        draw_overlay(frame, self.overlay_lines)
+
+    def take_frame(self):
+        return self.render_queue.get_nowait()
+
+    def pipeline_stats(self):
+        return {name: metrics.snapshot() for name, metrics in self.metrics.items()}
 
     def stop(self):
         self.running = False
         self.wait()
-        self.camera.release()
+        if self.camera is not None:
+            self.camera.release()
+        for name, stats in self.pipeline_stats().items():
+            print(f"Pipeline {name} (camera {self.camera_index}): {stats}")
+        print(f"Metrics (camera {self.camera_index}): {self.detector.metrics.summary_line()}")
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    startup.mark("QApplication")
     main_win = MainWindow()
+    startup.mark("main window")
     main_win.show()
+    QTimer.singleShot(0, main_win.window_shown)
     sys.exit(app.exec())
@@ -0,0 +1,292 @@
+# metrics.py
+import json
+import time
+import bisect
+import threading
+from collections import deque
+
+
+class StageMetrics:
+    # Latency, throughput and queue statistics for one stage of the frame
+    # pipeline. Latencies are kept in a rolling window of the last samples.
+    def __init__(self, name, window=300):
+        self.name = name
+        self.latencies = deque(maxlen=window)
+        self.count = 0
+        self.dropped = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            self.count += 1
+
+    def record_drop(self, count=1):
+        with self.lock:
+            self.dropped += count
+
+    def set_queue_depth(self, depth):
+        with self.lock:
+            self.queue_depth = depth
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            snapshot = {
+                "name": self.name,
+                "count": self.count,
+                "dropped": self.dropped,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+            }
+        if latencies:
+            snapshot["avg_ms"] = sum(latencies) / len(latencies) * 1000
+            snapshot["p50_ms"] = percentile(latencies, 50) * 1000
+            snapshot["p95_ms"] = percentile(latencies, 95) * 1000
+            snapshot["max_ms"] = latencies[-1] * 1000
+        return snapshot
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    index = int(round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+class RollingHistogram:
+    # Fixed log-scale buckets (10 us .. ~10 s, 25% apart) over a rolling time
+    # window split into slices. Recording is one bisect and two adds, so the
+    # histograms can stay on in production.
+    BOUNDS = None  # Filled in below the class
+
+    def __init__(self, window=60.0, slices=6):
+        self.slice_length = window / slices
+        self.counts = [[0] * (len(self.BOUNDS) + 1) for _ in range(slices)]
+        self.sums = [0.0] * slices
+        self.current = 0
+        self.slice_end = time.monotonic() + self.slice_length
+        self.total_count = 0  # Since start, not just the window
+        self.lock = threading.Lock()
+
+    def record(self, value):
+        bucket = bisect.bisect_left(self.BOUNDS, value)
+        with self.lock:
+            now = time.monotonic()
+            if now >= self.slice_end:
+                self.rotate(now)
+            self.counts[self.current][bucket] += 1
+            self.sums[self.current] += value
+            self.total_count += 1
+
+    def rotate(self, now):
+        # Clear every slice that expired since the last record
+        expired = min(len(self.counts), int((now - self.slice_end) / self.slice_length) + 1)
+        for _ in range(expired):
+            self.current = (self.current + 1) % len(self.counts)
+            self.counts[self.current] = [0] * (len(self.BOUNDS) + 1)
+            self.sums[self.current] = 0.0
+        self.slice_end += expired * self.slice_length
+        if self.slice_end <= now:
+            self.slice_end = now + self.slice_length
+
+    def snapshot(self):
+        with self.lock:
+            if time.monotonic() >= self.slice_end:
+                self.rotate(time.monotonic())
+            merged = [sum(column) for column in zip(*self.counts)]
+            total = sum(self.sums)
+        count = sum(merged)
+        if not count:
+            return {"count": 0}
+        return {
+            "count": count,
+            "avg_ms": total / count * 1000,
+            "p50_ms": self.bucket_percentile(merged, count, 50) * 1000,
+            "p95_ms": self.bucket_percentile(merged, count, 95) * 1000,
+            "p99_ms": self.bucket_percentile(merged, count, 99) * 1000,
+        }
+
+    def bucket_percentile(self, merged, count, pct):
+        # Upper bound of the bucket holding the percentile
+        target = pct / 100 * count
+        seen = 0
+        for i, bucket_count in enumerate(merged):
+            seen += bucket_count
+            if seen >= target:
+                return self.BOUNDS[i] if i < len(self.BOUNDS) else self.BOUNDS[-1]
+        return self.BOUNDS[-1]
+
+
+def log_bounds(low, high, factor):
+    bounds = []
+    bound = low
+    while bound < high:
+        bounds.append(bound)
+        bound *= factor
+    return bounds
+
+
+RollingHistogram.BOUNDS = log_bounds(1e-5, 10.0, 1.25)
+
+
+class FrameMetrics:
+    # Per-stage timers, counters and gauges for the frame loop. Stage times
+    # go into rolling histograms, counters only ever grow, gauges hold the
+    # last value (e.g. active tracks, cache stats).
+    def __init__(self, window=60.0):
+        self.window = window
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    def add_time(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self.lock:
+                histogram = self.stages.setdefault(stage, RollingHistogram(self.window))
+        histogram.record(seconds)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def snapshot(self):
+        with self.lock:
+            stages = dict(self.stages)
+            counters = dict(self.counters)
+        return {
+            "stages": {name: histogram.snapshot() for name, histogram in stages.items()},
+            "counters": counters,
+            "gauges": dict(self.gauges),
+        }
+
+    def summary_line(self):
+        snapshot = self.snapshot()
+        parts = [f"{name} {s['p50_ms']:.1f}/{s['p95_ms']:.1f}ms"
+                 for name, s in snapshot["stages"].items() if s.get("count")]
+        parts += [f"{name}={value}" for name, value in snapshot["counters"].items()]
+        parts += [f"{name}={format_gauge(value)}" for name, value in snapshot["gauges"].items()]
+        return " | ".join(parts)
+
+    def overlay_lines(self):
+        snapshot = self.snapshot()
+        lines = [f"{name}: {s['p50_ms']:.1f} ms (p95 {s['p95_ms']:.1f})"
+                 for name, s in snapshot["stages"].items() if s.get("count")]
+        lines += [f"{name}: {format_gauge(value)}" for name, value in snapshot["gauges"].items()]
+        return lines
+
+
+def format_gauge(value):
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    if isinstance(value, dict):
+        return ",".join(f"{k}:{format_gauge(v)}" for k, v in value.items())
+    return str(value)
+
+
+class MetricsReporter(threading.Thread):
+    # Prints a summary line every `interval` seconds and, if a port is given,
+    # serves the full snapshot as JSON on http://127.0.0.1:<port>/metrics
+    def __init__(self, metrics, interval=10.0, port=None, extra=None, name=None):
+        super(MetricsReporter, self).__init__(daemon=True)
+        self.metrics = metrics
+        self.name = name  # Shown in the summary line, e.g. "camera 1"
+        self.interval = interval
+        self.port = port
+        self.extra = extra  # Optional callable returning more data for the endpoint
+        self.stop_event = threading.Event()
+        self.server = None
+
+    def run(self):
+        if self.port:
+            self.start_server()
+        while not self.stop_event.wait(self.interval):
+            prefix = f"Metrics ({self.name})" if self.name else "Metrics"
+            print(f"{prefix}: {self.metrics.summary_line()}")
+
+    def start_server(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        reporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = json.dumps(reporter.payload(), default=str).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Keep scrapes out of the console
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Metrics endpoint on http://127.0.0.1:{self.port}/metrics")
+
+    def payload(self):
+        payload = self.metrics.snapshot()
+        if self.extra:
+            payload.update(self.extra())
+        return payload
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server:
+            self.server.shutdown()
+
+
+class StartupTimer:
+    # Wall time of the startup phases (STARTUP_TIMING=1 in main.py). The
+    # main thread's phases follow each other, mark(name) ends one at the
+    # previous mark. Background work overlaps them and is recorded with
+    # span(name, started). Safe to call from any thread.
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.last = self.origin
+        self.phases = []  # (name, start, end) in seconds since origin
+        self.lock = threading.Lock()
+
+    def now(self):
+        return time.perf_counter()
+
+    def mark(self, name):
+        end = time.perf_counter()
+        with self.lock:
+            self.phases.append((name, self.last - self.origin, end - self.origin))
+            self.last = end
+
+    def span(self, name, started):
+        end = time.perf_counter()
+        with self.lock:
+            self.phases.append((name, started - self.origin, end - self.origin))
+
+    def report(self):
+        with self.lock:
+            phases = sorted(self.phases, key=lambda phase: phase[2])
+        lines = [f"{'phase':<24} {'start ms':>9} {'took ms':>9} {'done ms':>9}"]
+        for name, start, end in phases:
+            lines.append(f"{name:<24} {start * 1000:>9.1f} {(end - start) * 1000:>9.1f} {end * 1000:>9.1f}")
+        return "\n".join(lines)
+
+
+def draw_overlay(img, lines, origin=(10, 20), line_height=18):
+    # Small text block in the top-left corner of the frame
+    import cv2
+    x, y = origin
+    for line in lines:
+        cv2.putText(img, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 3)
+        cv2.putText(img, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
+        y += line_height
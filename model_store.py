@@ -0,0 +1,163 @@
+# model_store.py
+# Binary store for LBPH models. OpenCV's YAML keeps one text matrix per
+# training image and takes seconds to parse once the gallery grows; this
+# layout is a small versioned header followed by the labels and one
+# contiguous float32 histogram matrix, so loading is a memory map.
+#
+#   offset 0   header (64 bytes): magic, version, radius, neighbors, grid_x,
+#              grid_y, row count, histogram size, prototypes per user (0 when
+#              every sample is kept, version 2)
+#   offset 64  labels, int32[count]
+#   aligned    histograms, float32[count, size], starting on a 64-byte boundary
+#
+# export_yaml / import_yaml convert to and from the file written by
+# cv2.face.LBPHFaceRecognizer.save(), so models still move both ways.
+import os
+import cv2
+import struct
+import numpy as np
+
+MAGIC = b"LBPHSTOR"
+VERSION = 2
+HEADER = struct.Struct("<8sIIIIIQQI")  # Little-endian, padded to HEADER_SIZE
+HEADER_V1 = struct.Struct("<8sIIIIIQQ")
+HEADER_SIZE = 64
+ALIGNMENT = 64
+YAML_EXTENSIONS = (".yml", ".yaml", ".xml")
+DEFAULT_PARAMS = {"radius": 1, "neighbors": 8, "grid_x": 8, "grid_y": 8}
+
+
+def histograms_offset(count):
+    end = HEADER_SIZE + 4 * count
+    return (end + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_store(path, histograms, labels, params=None):
+    # Written to a temporary file and moved over the target, so readers never
+    # see a partial store (and a memory-mapped old store stays valid)
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    histograms = np.ascontiguousarray(histograms, np.float32)
+    labels = np.ascontiguousarray(labels, np.int32).reshape(-1)
+    if histograms.ndim != 2 or len(histograms) != len(labels):
+        raise ValueError(f"Expected one histogram row per label, got {histograms.shape} for {len(labels)} labels")
+    count, size = histograms.shape
+    header = HEADER.pack(MAGIC, VERSION, params["radius"], params["neighbors"], params["grid_x"],
+                         params["grid_y"], count, size, params.get("prototypes") or 0)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(labels.astype("<i4").tobytes())
+        f.write(b"\0" * (histograms_offset(count) - HEADER_SIZE - 4 * count))
+        f.write(histograms.astype("<f4").tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE or data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not an LBPH model store")
+    version = struct.unpack_from("<I", data, len(MAGIC))[0]
+    if version > VERSION:
+        raise ValueError(f"{path} has store version {version}, this code reads up to {VERSION}")
+    if version == 1:
+        magic, version, radius, neighbors, grid_x, grid_y, count, size = HEADER_V1.unpack_from(data)
+        prototypes = 0
+    else:
+        magic, version, radius, neighbors, grid_x, grid_y, count, size, prototypes = HEADER.unpack_from(data)
+    params = {"radius": radius, "neighbors": neighbors, "grid_x": grid_x, "grid_y": grid_y,
+              "prototypes": prototypes}
+    return params, count, size
+
+
+def read_store(path, mmap=None):
+    # Returns (histograms, labels, params). Histograms are a read-only memory
+    # map by default; on Windows a mapped file cannot be replaced by the next
+    # save, so there they are read into memory instead.
+    if mmap is None:
+        mmap = os.name != "nt"
+    params, count, size = read_header(path)
+    labels = np.fromfile(path, dtype="<i4", count=count, offset=HEADER_SIZE).astype(np.int32)
+    offset = histograms_offset(count)
+    if count == 0:
+        histograms = np.empty((0, size), np.float32)
+    elif mmap:
+        histograms = np.memmap(path, dtype="<f4", mode="r", offset=offset, shape=(count, size))
+    else:
+        histograms = np.fromfile(path, dtype="<f4", count=count * size, offset=offset).reshape(count, size)
+    if len(labels) != count or len(histograms) != count:
+        raise ValueError(f"{path} is truncated")
+    return histograms, labels, params
+
+
+def export_yaml(path, histograms, labels, params=None):
+    # Same node layout cv2.face.LBPHFaceRecognizer.read() expects
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+    try:
+        fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+        fs.write("threshold", float(np.finfo(np.float64).max))  # Unknowns are decided by the backend
+        for key in ("radius", "neighbors", "grid_x", "grid_y"):
+            fs.write(key, int(params[key]))
+        fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+        for row in histograms:
+            fs.write("", np.asarray(row, np.float32).reshape(1, -1))
+        fs.endWriteStruct()
+        fs.write("labels", np.asarray(labels, np.int32).reshape(-1, 1))
+        fs.startWriteStruct("labelsInfo", cv2.FileNode_SEQ)
+        fs.endWriteStruct()
+        fs.endWriteStruct()
+    finally:
+        fs.release()
+
+
+def import_yaml(path):
+    # Returns (histograms, labels, params) from an OpenCV LBPH model file
+    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+    try:
+        node = fs.getNode("opencv_lbphfaces")
+        if node.empty():
+            raise ValueError(f"{path} is not an OpenCV LBPH model")
+        params = {key: int(node.getNode(key).real()) for key in ("radius", "neighbors", "grid_x", "grid_y")}
+        params["prototypes"] = 0  # Not part of OpenCV's format
+        size = params["grid_x"] * params["grid_y"] * (1 << params["neighbors"])
+        rows = node.getNode("histograms")
+        histograms = np.empty((rows.size(), size), np.float32)
+        for i in range(rows.size()):
+            histograms[i] = rows.at(i).mat().reshape(-1)
+        labels = node.getNode("labels").mat()
+        labels = np.empty(0, np.int32) if labels is None else labels.reshape(-1).astype(np.int32)
+    finally:
+        fs.release()
+    return histograms, labels, params
+
+
+def is_yaml(path):
+    return os.path.splitext(path)[1].lower() in YAML_EXTENSIONS
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="LBPH model store conversion")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Convert an OpenCV YAML model to a binary store")
+    import_parser.add_argument("yaml", nargs="?", default="face_model.yml")
+    import_parser.add_argument("store", nargs="?", default="face_model.lbph")
+    export_parser = subparsers.add_parser("export", help="Convert a binary store to an OpenCV YAML model")
+    export_parser.add_argument("store", nargs="?", default="face_model.lbph")
+    export_parser.add_argument("yaml", nargs="?", default="face_model.yml")
+    info_parser = subparsers.add_parser("info", help="Print the header of a binary store")
+    info_parser.add_argument("store", nargs="?", default="face_model.lbph")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        histograms, labels, params = import_yaml(args.yaml)
+        write_store(args.store, histograms, labels, params)
+        print(f"Imported {len(labels)} histograms into {args.store}")
+    elif args.command == "export":
+        histograms, labels, params = read_store(args.store)
+        export_yaml(args.yaml, histograms, labels, params)
+        print(f"Exported {len(labels)} histograms to {args.yaml}")
+    else:
+        params, count, size = read_header(args.store)
+        print(f"{args.store}: {count} histograms of {size} floats, {params}")
@@ -0,0 +1,153 @@
+# pipeline.py
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+
+class DropOldestQueue:
+    # Bounded hand-off queue between two pipeline stages. When it is full the
+    # oldest item is thrown away, so the consumer always works on fresh data.
+    def __init__(self, maxsize=1, metrics=None):
+        self.maxsize = maxsize
+        self.metrics = metrics
+        self.items = deque()
+        self.condition = threading.Condition()
+
+    def put(self, item):
+        # Returns True if the queue was empty, i.e. the consumer may need a wake-up
+        with self.condition:
+            was_empty = not self.items
+            while len(self.items) >= self.maxsize:
+                self.items.popleft()
+                if self.metrics:
+                    self.metrics.record_drop()
+            self.items.append(item)
+            if self.metrics:
+                self.metrics.set_queue_depth(len(self.items))
+            self.condition.notify()
+        return was_empty
+
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.items:
+                self.condition.wait(timeout)
+            return self.pop()
+
+    def get_nowait(self):
+        with self.condition:
+            return self.pop()
+
+    def pop(self):
+        if not self.items:
+            return None
+        item = self.items.popleft()
+        if self.metrics:
+            self.metrics.set_queue_depth(len(self.items))
+        return item
+
+    def clear(self):
+        with self.condition:
+            self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class FrameGrabber(threading.Thread):
+    # Reads the camera as fast as it delivers frames and keeps only the latest
+    # one in the output queue, so the camera buffer never goes stale. A video
+    # file (is_file) decodes much faster than real time, so its frames are
+    # released at their own timestamps instead; at its end the grabber stops
+    # with `ended` set, or starts over with `loop`.
+    def __init__(self, camera, output, metrics=None, is_file=False, loop=False):
+        super(FrameGrabber, self).__init__(daemon=True)
+        self.camera = camera
+        self.output = output
+        self.metrics = metrics
+        self.is_file = is_file
+        self.loop = loop
+        self.running = True
+        self.ended = False
+
+    def run(self):
+        fps = self.camera.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+        clip_start, index = time.perf_counter(), 0
+        while self.running:
+            start = time.perf_counter()
+            ret, frame = self.camera.read()
+            if not ret:
+                if self.is_file:
+                    if not self.loop:
+                        self.ended = True
+                        break
+                    self.camera.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    clip_start, index = time.perf_counter(), 0
+                    continue
+                # Camera not ready or stream hiccup, back off briefly
+                time.sleep(0.01)
+                continue
+            read_end = time.perf_counter()
+            if self.is_file:
+                self.wait_until(clip_start + self.frame_time(index, fps))
+                index += 1
+            captured_at = time.perf_counter()
+            self.output.put((captured_at, frame))
+            if self.metrics:
+                self.metrics.record(read_end - start)
+
+    def frame_time(self, index, fps):
+        # Seconds into the clip of the frame just read
+        position = self.camera.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if position <= 0 and index > 0:
+            position = index / (fps if fps > 0 else 30.0)
+        return position
+
+    def wait_until(self, due):
+        # Short sleeps so stop() is not held up by a long gap in the clip
+        while self.running:
+            remaining = due - time.perf_counter()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 0.05))
+
+    def stop(self):
+        self.running = False
+        if self.is_alive():
+            self.join()
+
+
+class DisplayBuffers:
+    # Ring of preallocated display-sized frames. The worker resizes each
+    # processed frame straight into the next slot, so the GUI thread only
+    # wraps memory that already has its final size and layout. A slot is
+    # reused after `count` frames, enough for one queued and one on screen.
+    def __init__(self, size=(800, 600), count=4, rgb=False):
+        self.size = size
+        self.count = count
+        self.rgb = rgb  # Swap to RGB in the worker when Qt lacks Format_BGR888
+        self.buffers = []
+        self.source_shape = None
+        self.index = 0
+
+    def fit(self, frame):
+        # Fit inside the display size keeping the aspect ratio
+        if frame.shape != self.source_shape:
+            h, w = frame.shape[:2]
+            scale = min(self.size[0] / w, self.size[1] / h)
+            out_w, out_h = max(1, int(w * scale)), max(1, int(h * scale))
+            self.buffers = [np.empty((out_h, out_w, 3), dtype=np.uint8) for _ in range(self.count)]
+            self.source_shape = frame.shape
+        buffer = self.buffers[self.index]
+        self.index = (self.index + 1) % self.count
+
+        out_h, out_w = buffer.shape[:2]
+        if (out_h, out_w) == frame.shape[:2]:
+            np.copyto(buffer, frame)
+        else:
+            # Bilinear like Qt's smooth scaling, INTER_AREA costs ~7x more at 720p
+            cv2.resize(frame, (out_w, out_h), dst=buffer, interpolation=cv2.INTER_LINEAR)
+        if self.rgb:
+            cv2.cvtColor(buffer, cv2.COLOR_BGR2RGB, dst=buffer)
+        return buffer
@@ -0,0 +1,75 @@
+# preprocess.py
+import os
+import cv2
+import threading
+import numpy as np
+
+
+class FacePreprocessor:
+    # The one normalization applied to every face before the recognizer sees
+    # it, at capture, training and inference alike: grayscale, optional eye
+    # alignment, resize to a fixed canonical size and contrast equalization
+    # (CLAHE by default). Models must be trained with the same settings they
+    # are queried with, `key` identifies them for caches.
+    def __init__(self, size=(100, 100), equalize="clahe", clip_limit=2.0, tile_grid=(8, 8), align=False):
+        self.size = size
+        self.equalize = equalize  # "clahe", "hist" or None
+        self.clip_limit = clip_limit
+        self.tile_grid = tile_grid
+        self.align = align
+        self.local = threading.local()  # CLAHE and cascade objects per thread
+        if align and self.eye_cascade() is None:
+            print("Eye cascade not available, faces will not be aligned.")
+            self.align = False
+
+    @property
+    def key(self):
+        return f"{self.size[0]}x{self.size[1]}-{self.equalize}-{self.clip_limit}-" \
+               f"{self.tile_grid[0]}x{self.tile_grid[1]}-{'align' if self.align else 'noalign'}"
+
+    def __call__(self, face):
+        gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+        if self.align:
+            gray = self.align_eyes(gray)
+        if gray.shape[:2] != (self.size[1], self.size[0]):
+            interpolation = cv2.INTER_AREA if gray.shape[1] > self.size[0] else cv2.INTER_LINEAR
+            gray = cv2.resize(gray, self.size, interpolation=interpolation)
+        if self.equalize == "clahe":
+            gray = self.clahe().apply(gray)
+        elif self.equalize == "hist":
+            gray = cv2.equalizeHist(gray)
+        return gray
+
+    def clahe(self):
+        clahe = getattr(self.local, "clahe", None)
+        if clahe is None:
+            clahe = self.local.clahe = cv2.createCLAHE(clipLimit=self.clip_limit, tileGridSize=self.tile_grid)
+        return clahe
+
+    def eye_cascade(self):
+        if not hasattr(self.local, "eyes"):
+            path = os.path.join(cv2.data.haarcascades, "haarcascade_eye.xml")
+            cascade = cv2.CascadeClassifier(path) if os.path.exists(path) else None
+            self.local.eyes = cascade if cascade is not None and not cascade.empty() else None
+        return self.local.eyes
+
+    def align_eyes(self, gray):
+        # Rotate so the two eyes are level. Crops where two eyes cannot be
+        # found in the upper half are returned unchanged.
+        height, width = gray.shape[:2]
+        upper = gray[:height // 2]
+        eyes = self.eye_cascade().detectMultiScale(upper, scaleFactor=1.1, minNeighbors=5,
+                                                   minSize=(max(8, width // 8), max(8, width // 8)))
+        if len(eyes) < 2:
+            return gray
+        eyes = sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2]
+        (x1, y1, w1, h1), (x2, y2, w2, h2) = sorted(eyes, key=lambda e: e[0])
+        left = (x1 + w1 / 2, y1 + h1 / 2)
+        right = (x2 + w2 / 2, y2 + h2 / 2)
+        angle = np.degrees(np.arctan2(right[1] - left[1], right[0] - left[0]))
+        if abs(angle) < 1 or abs(angle) > 30:
+            return gray  # Already level, or the two detections are not a pair of eyes
+        center = ((left[0] + right[0]) / 2, (left[1] + right[1]) / 2)
+        rotation = cv2.getRotationMatrix2D(center, angle, 1.0)
+        return cv2.warpAffine(gray, rotation, (width, height), flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_REPLICATE)
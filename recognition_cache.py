@@ -0,0 +1,53 @@
+# recognition_cache.py
+
+class RecognitionCache:
+    # Remembers the last recognition result for each tracked face so the
+    # LBPH predict only has to run again when the result may have changed.
+    def __init__(self, interval=10, drift=0.25, growth=0.2, confidence_margin=0.15):
+        self.interval = interval                    # Frames before a forced re-recognition
+        self.drift = drift                          # Max centre movement, as a fraction of face width
+        self.growth = growth                        # Max relative change of the face size
+        self.confidence_margin = confidence_margin  # Re-check results this close to the cutoff (fraction of it)
+        self.entries = {}  # face_id -> {'result', 'bbox', 'frame'}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, face_id, bbox, frame_index, threshold):
+        entry = self.entries.get(face_id)
+        if entry is None or self.is_stale(entry, bbox, frame_index, threshold):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["result"]
+
+    def store(self, face_id, bbox, frame_index, result):
+        self.entries[face_id] = {"result": result, "bbox": bbox, "frame": frame_index}
+
+    def is_stale(self, entry, bbox, frame_index, threshold):
+        if frame_index - entry["frame"] >= self.interval:
+            return True
+
+        confidence = entry["result"][3]
+        if confidence is None or abs(confidence - threshold) < self.confidence_margin * threshold:
+            return True
+
+        fx, fy, fw, fh = bbox
+        ex, ey, ew, eh = entry["bbox"]
+        dx = (fx + fw / 2) - (ex + ew / 2)
+        dy = (fy + fh / 2) - (ey + eh / 2)
+        if (dx * dx + dy * dy) ** 0.5 > self.drift * max(ew, 1):
+            return True
+        if abs(fw * fh - ew * eh) > self.growth * max(ew * eh, 1):
+            return True
+        return False
+
+    def discard(self, face_id):
+        self.entries.pop(face_id, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": hit_rate}
@@ -1,103 +1,375 @@
 import os
+import re
 import cv2
-import numpy as np
+import time
 import json  # Import json for serialization
+import threading
+from dataset_loader import DatasetLoader
+from preprocess import FacePreprocessor
+from recognizer_backends import create_backend
+from user_registry import get_registry
 
 # recognizer.py
 
 class Recognizer:
-    def __init__(self):
-        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+    def __init__(self, backend="lbph", **backend_options):
+        # LBPH is the default backend, see recognizer_backends.py for the others
+        self.backend_name = backend
+        self.backend_options = backend_options
+        self.backend = create_backend(backend, **backend_options)
         self.label_map = {}  # Maps label (int) to {'name': str, 'type': str}
         self.model_loaded = False
-        self.model_path = "face_model.yml"
+        # "empty" until load_model runs, then "loading", "ready", "missing" or "failed"
+        self.model_state = "empty"
+        self.confidence_threshold = self.backend.threshold  # Distance cutoff, lower is a better match
+        # Same normalization for training samples and live crops. A model
+        # must be rebuilt after these settings change.
+        self.preprocessor = FacePreprocessor(size=(100, 100), equalize="clahe", align=False)
+        self.canonical_size = self.preprocessor.size
+        self.metrics = None  # Optional metrics.FrameMetrics for crop/predict timings
+        self.model_path = self.backend.default_model_path
         self.label_map_path = "label_map.json"  # Path to save label_map
+        # Normalized samples are cached per user next to the packed pixels
+        self.dataset_loader = DatasetLoader(cache_dir=".dataset_cache", preprocess=self.preprocessor)
+
+        # In-memory label map cache, only re-read when the file on disk changes
+        self.label_map_mtime = None
+        self.label_map_check_interval = 1.0  # seconds between mtime checks
+        self.label_map_next_check = 0.0
+        self.label_map_reloads = 0
+        self.label_map_frames = 0
+
+        # Background training swaps a new model in under this lock
+        self.lock = threading.Lock()
+        self.training = False
+        self.model_version = 0  # Bumped on every swap so callers can drop cached results
 
     def train_model(self, dataset_path="dataset"):
+        model = self.build_model(dataset_path)
+        if model is None:
+            return False
+        label_map = self.build_label_map()
+        self.save_model(model)
+        self.swap_model(model, label_map)
+        self.write_label_map()  # Save label_map after training
+        print(f"Model trained and swapped in ({self.model_version})")
+        return True
+
+    def enroll_user(self, user_name, dataset_path="dataset"):
+        # Adds only this user's samples to the live model with the backend's
+        # update() (LBPH update for the default backend)
+        # instead of retraining on the whole dataset. Without a live model
+        # there is nothing to update, so every user is trained from scratch.
+        with self.lock:
+            loaded = self.model_loaded
+        if not loaded:
+            return self.train_model(dataset_path)
+        label = self.label_for_folder(user_name)
+        if label is None:
+            print(f"Cannot enroll {user_name}: folder name has no user id.")
+            return False
+        faces = list(self.read_user_images(os.path.join(dataset_path, user_name)))
+        if len(faces) == 0:
+            print(f"No samples found for {user_name}.")
+            return False
+
+        label_map = self.build_label_map()
+        with self.lock:
+            model = self.backend
+        model.update(faces, [label] * len(faces))
+        self.swap_model(model, label_map)
+        self.save_model()
+        self.write_label_map()
+        print(f"Enrolled {user_name} with {len(faces)} samples ({self.model_version})")
+        return True
+
+    def compact_model(self, prototypes):
+        # Keeps `prototypes` histograms per user in the live model, then
+        # saves and serves the compacted model (backends with compact() only)
+        with self.lock:
+            model, loaded = self.backend, self.model_loaded
+        if not loaded or not hasattr(model, "compact"):
+            print(f"Cannot compact: no loaded {self.backend_name} model that supports prototypes.")
+            return False
+        before = len(model.state[1])
+        model.compact(prototypes)
+        self.swap_model(model, self.label_map)
+        self.save_model()
+        print(f"Model compacted from {before} to {len(model.state[1])} histograms ({self.model_version})")
+        return True
+
+    def enroll_user_async(self, user_name, callback=None, dataset_path="dataset"):
+        return self.run_in_background(lambda: self.enroll_user(user_name, dataset_path), callback)
+
+    def run_in_background(self, task, callback=None):
+        # Only one training/enrollment job at a time
+        with self.lock:
+            if self.training:
+                print("Training already in progress.")
+                return False
+            self.training = True
+
+        def worker():
+            success = False
+            try:
+                success = task()
+            except Exception as e:
+                print(f"Background task failed: {e}")
+            finally:
+                with self.lock:
+                    self.training = False
+            if callback:
+                callback(success)
+
+        threading.Thread(target=worker, daemon=True).start()
+        return True
+
+    def save_model(self, model=None):
+        # Save to a temporary file first so a crash never leaves a half-written model
+        model = model or self.backend
+        root, ext = os.path.splitext(self.model_path)
+        tmp_path = root + ".tmp" + ext  # Keep the extension, OpenCV picks the format from it
+        model.save(tmp_path)
+        os.replace(tmp_path, self.model_path)
+
+    def label_for_folder(self, folder_name):
+        # user_<id> folders map to the row id used in the label map, so labels
+        # stay the same across full rebuilds and incremental updates
+        match = re.fullmatch(r"user_(\d+)", folder_name)
+        return int(match.group(1)) if match else None
+
+    def build_model(self, dataset_path="dataset"):
+        # Builds a fresh model without touching the live one
         faces = []
         labels = []
-        label_counter = 0
-
-        # Build a label map and training data
-        for folder_name in os.listdir(dataset_path):
-            user_folder = os.path.join(dataset_path, folder_name)
-            if os.path.isdir(user_folder):
-                self.label_map[label_counter] = {"name": folder_name, "type": "User"}
-                for img_file in os.listdir(user_folder):
-                    if img_file.lower().endswith(".jpg"):
-                        img_path = os.path.join(user_folder, img_file)
-                        gray = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-                        if gray is not None:
-                            faces.append(gray)
-                            labels.append(label_counter)
+        with os.scandir(dataset_path) as entries:
+            folders = sorted(entry.name for entry in entries if entry.is_dir())
+        ids = [self.label_for_folder(f) for f in folders]
+        # Folders without a user id get labels after the highest id
+        label_counter = max([i for i in ids if i is not None], default=-1) + 1
+
+        # Build training data, one label per user folder
+        for folder_name, label in zip(folders, ids):
+            if label is None:
+                label = label_counter
                 label_counter += 1
+            for gray in self.read_user_images(os.path.join(dataset_path, folder_name)):
+                faces.append(gray)
+                labels.append(label)
 
-        # Include enemies in the label map
+        # Include enemies
         enemies_file = "enemies.xlsx"
         if os.path.exists(enemies_file):
+            import pandas as pd
             df_enemies = pd.read_excel(enemies_file)
             for idx, row in df_enemies.iterrows():
-                self.label_map[label_counter] = {"name": row["Name"], "type": "Enemy"}
                 # Assuming enemy images are stored similarly
                 enemy_folder = os.path.join(dataset_path, row["Name"])
-                for img_file in os.listdir(enemy_folder):
-                    if img_file.lower().endswith(".jpg"):
-                        img_path = os.path.join(enemy_folder, img_file)
-                        gray = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-                        if gray is not None:
-                            faces.append(gray)
-                            labels.append(label_counter)
+                for gray in self.read_user_images(enemy_folder):
+                    faces.append(gray)
+                    labels.append(label_counter)
                 label_counter += 1
 
-        if len(faces) > 0:
-            self.recognizer.train(faces, np.array(labels))
-            self.recognizer.save(self.model_path)
+        if len(faces) == 0:
+            return None
+        model = create_backend(self.backend_name, **self.backend_options)
+        if getattr(self.backend, "prototypes", None) and not getattr(model, "prototypes", None):
+            model.prototypes = self.backend.prototypes  # A compacted model stays compact after a rebuild
+        model.train(faces, labels)
+        return model
+
+    def swap_model(self, model, label_map):
+        with self.lock:
+            self.backend = model
+            self.label_map = label_map
             self.model_loaded = True
-            self.save_label_map()  # Save label_map after training
-            self.load_model() 
+            self.model_state = "ready"
+            self.model_version += 1
+
+    def read_user_images(self, user_folder):
+        # Loose .jpg samples plus any samples.zip archive written by SampleWriter,
+        # decoded in parallel and cached by the dataset loader
+        return self.dataset_loader.load_user(user_folder)
+
+    def build_label_map(self):
+        return get_registry().label_map()
 
     def save_label_map(self):
-        import pandas as pd
-        label_map_data = {}
-        users_file = "users.xlsx"
-        if os.path.exists(users_file):
-            df_users = pd.read_excel(users_file)
-            for idx, row in df_users.iterrows():
-                label_map_data[str(idx)] = {"name": row["Name"], "type": row["Type"]}
-
-        self.label_map = label_map_data
+        self.label_map = self.build_label_map()
+        self.write_label_map()
+
+    def write_label_map(self):
         with open(self.label_map_path, "w") as f:
             json.dump(self.label_map, f, indent=4)
+        # The in-memory copy is already up to date, remember the new mtime
+        # so the watcher does not reload our own write
+        self.label_map_mtime = self.get_label_map_mtime()
         print(f"Label map saved to {self.label_map_path}")
         
-    def load_model(self):
-        if os.path.exists(self.model_path):
-            self.recognizer.read(self.model_path)
-            self.model_loaded = True
-            self.load_label_map()  # Load label_map when loading the model
+    def load_model(self, dataset_path="dataset"):
+        # Returns True once a model is live. Predictions report no match
+        # while model_state is "loading".
+        self.model_state = "loading"
+        try:
+            legacy_path = getattr(self.backend, "legacy_model_path", None)
+            if not os.path.exists(self.model_path) and legacy_path and os.path.exists(legacy_path):
+                return self.migrate_model(legacy_path, dataset_path)
+            if not os.path.exists(self.model_path):
+                print(f"Model file {self.model_path} not found.")
+                self.model_state = "missing"
+                return False
+            model = create_backend(self.backend_name, **self.backend_options)
+            model.load(self.model_path)
+            self.load_label_map()  # Names must be there before the first match is reported
+            with self.lock:
+                self.backend = model
+                self.model_loaded = True
+                self.model_state = "ready"
+                self.model_version += 1
             print(f"Model loaded from {self.model_path}")
-        else:
-            print(f"Model file {self.model_path} not found.")
+            return True
+        except Exception:
+            self.model_state = "failed"
+            raise
+
+    def load_model_async(self, callback=None):
+        # Startup path: the caller keeps going (the window is shown) while
+        # the model loads. callback(success) runs on the loading thread.
+        return self.run_in_background(self.load_model, callback)
+
+    def migrate_model(self, legacy_path, dataset_path="dataset"):
+        # A model in the old format was trained on raw crops, not on what the
+        # preprocessor produces, so it cannot be converted and served: it is
+        # rebuilt from the dataset instead. The old file is kept.
+        if os.path.isdir(dataset_path) and self.train_model(dataset_path):
+            print(f"Model in {legacy_path} replaced by {self.model_path}, rebuilt from {dataset_path}")
+            return True
+        print(f"Model {legacy_path} predates face preprocessing and no dataset was found "
+              f"in {dataset_path} to rebuild it. Retrain the model.")
+        self.model_state = "failed"
+        return False
 
     def load_label_map(self):
         if os.path.exists(self.label_map_path):
             with open(self.label_map_path, "r") as f:
                 self.label_map = json.load(f)
+            self.label_map_mtime = self.get_label_map_mtime()
+            self.label_map_reloads += 1
             print(f"Label map loaded from {self.label_map_path}")
         else:
             print(f"Label map file {self.label_map_path} not found.")
 
+    def get_label_map_mtime(self):
+        try:
+            return os.stat(self.label_map_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def refresh_label_map(self):
+        # Called once per frame. Only stats the file every
+        # label_map_check_interval seconds and reloads it when the mtime moved.
+        self.label_map_frames += 1
+        now = time.monotonic()
+        if now < self.label_map_next_check:
+            return False
+        self.label_map_next_check = now + self.label_map_check_interval
+
+        mtime = self.get_label_map_mtime()
+        if mtime is None or mtime == self.label_map_mtime:
+            return False
+        self.load_label_map()
+        return True
+
+    def label_map_stats(self):
+        return {"reloads": self.label_map_reloads, "frames": self.label_map_frames}
+
     def recognize_face(self, face_region):
-        # Convert to grayscale for LBPH
-        gray_face = cv2.cvtColor(face_region, cv2.COLOR_BGR2GRAY)
-        if not self.model_loaded:
-            return False, None, None
+        recognized, name, user_type, _ = self.predict_face(face_region)
+        return recognized, name, user_type
+
+    def predict_face(self, face_region):
+        # Same as recognize_face but also returns the match distance
+        # Grayscale, canonical size and equalized, as in training
+        gray_face = self.preprocessor(face_region)
+        with self.lock:
+            # Snapshot, a background swap may replace these at any time
+            model, label_map, loaded = self.backend, self.label_map, self.model_loaded
+        if not loaded:
+            return False, None, None, None
 
-        label, confidence = self.recognizer.predict(gray_face)
+        label, confidence = model.predict(gray_face)
         # Lower confidence => better match
-        if confidence < 100:
+        if confidence < self.confidence_threshold:
             label_str = str(label)
-            user_info = self.label_map.get(label_str, None)
+            user_info = label_map.get(label_str, None)
             if user_info:
-                return True, user_info['name'], user_info['type']
-        return False, None, None
+                return True, user_info['name'], user_info['type'], confidence
+        return False, None, None, confidence
+
+
+    def recognize_faces(self, img, boxes, metrics=None):
+        # Scores every face of a frame in one call. The frame is converted to
+        # grayscale once, crops are views normalized by the preprocessor, and
+        # results come back in box order as (recognized, name, type, distance).
+        # metrics overrides self.metrics, each camera's Detector passes its own.
+        metrics = metrics if metrics is not None else self.metrics
+        results = [(False, None, None, None)] * len(boxes)
+        with self.lock:
+            model, label_map, loaded = self.backend, self.label_map, self.model_loaded
+        if not loaded or len(boxes) == 0:
+            return results
+
+        start = time.perf_counter()
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        crops = []
+        indexes = []
+        for i, (x, y, w, h) in enumerate(boxes):
+            x0, y0 = max(0, int(x)), max(0, int(y))
+            x1, y1 = min(width, int(x + w)), min(height, int(y + h))
+            if x1 <= x0 or y1 <= y0:
+                continue  # Box is outside the frame
+            crops.append(self.preprocessor(gray[y0:y1, x0:x1]))
+            indexes.append(i)
+
+        crop_end = time.perf_counter()
+        predictions = model.predict_batch(crops)
+        if metrics:
+            metrics.add_time("crop", crop_end - start)
+            metrics.add_time("predict", time.perf_counter() - crop_end)
+            metrics.count("predicted_faces", len(crops))
+
+        for i, (label, confidence) in zip(indexes, predictions):
+            user_info = label_map.get(str(label), None) if confidence < self.confidence_threshold else None
+            if user_info:
+                results[i] = (True, user_info['name'], user_info['type'], confidence)
+            else:
+                results[i] = (False, None, None, confidence)
+        return results
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Face model maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="Retrain the model from every folder in the dataset")
+    enroll_parser = subparsers.add_parser("enroll", help="Add one user's samples to the existing model")
+    enroll_parser.add_argument("user", help="Dataset folder of the user, e.g. user_3")
+    compact_parser = subparsers.add_parser("compact", help="Keep only a few prototype histograms per user")
+    compact_parser.add_argument("count", type=int, nargs="?", default=10, help="Prototypes per user")
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--backend", default="lbph", help="Recognizer backend: lbph or embedding")
+    parser.add_argument("--prototypes", type=int, default=None,
+                        help="LBPH: histograms kept per user when rebuilding or enrolling")
+    args = parser.parse_args()
+
+    options = {"prototypes": args.prototypes} if args.prototypes else {}
+    recognizer = Recognizer(backend=args.backend, **options)
+    if args.command == "rebuild":
+        ok = recognizer.train_model(args.dataset)
+    elif args.command == "compact":
+        recognizer.load_model(args.dataset)
+        ok = recognizer.compact_model(args.count)
+    else:
+        recognizer.load_model(args.dataset)
+        ok = recognizer.enroll_user(args.user, args.dataset)
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,309 @@
+# recognizer_backends.py
+import os
+import cv2
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import lbph
+import model_store
+
+# Every backend offers the same small interface used by Recognizer:
+#   train(faces, labels), update(faces, labels), predict(gray) -> (label, distance),
+#   predict_batch(grays) -> [(label, distance), ...], save(path), load(path),
+#   and the attributes name, threshold, default_model_path.
+# A lower distance is a better match, anything at or above threshold is unknown.
+
+
+class ReadWriteLock:
+    # Many concurrent readers (predictions from several cameras) or one
+    # writer (an in-place update). Writers wait for running readers to leave
+    # and block new ones.
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writing = False
+        self.waiting_writers = 0
+
+    def acquire_read(self):
+        with self.condition:
+            while self.writing or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writing or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writing = True
+
+    def release_write(self):
+        with self.condition:
+            self.writing = False
+            self.condition.notify_all()
+
+
+class LBPHBackend:
+    # Local binary pattern histograms (lbph.py, bit-compatible with
+    # cv2.face.LBPHFaceRecognizer). The gallery is one float32 matrix with a
+    # label per row, persisted in the binary store of model_store.py and
+    # memory-mapped on load. .yml/.yaml/.xml paths read and write OpenCV's
+    # own format instead. With `prototypes` every user keeps only that many
+    # k-medoid histograms, so a prediction costs users x prototypes
+    # comparisons instead of one per captured sample.
+    name = "lbph"
+    default_model_path = "face_model.lbph"
+    legacy_model_path = "face_model.yml"  # Written by earlier versions, rebuilt from the dataset on first load
+
+    def __init__(self, threshold=100, radius=1, neighbors=8, grid_x=8, grid_y=8, prototypes=None):
+        self.threshold = threshold
+        self.prototypes = prototypes  # Histograms kept per user, None keeps every sample
+        self.params = {"radius": radius, "neighbors": neighbors, "grid_x": grid_x, "grid_y": grid_y}
+        # (histograms, labels) is replaced as a whole under the write lock
+        self.state = (np.empty((0, self.dimension()), np.float32), np.empty(0, np.int32))
+        self.lock = ReadWriteLock()  # update() swaps the gallery, predictions only read it
+
+    def dimension(self):
+        return self.params["grid_x"] * self.params["grid_y"] * (1 << self.params["neighbors"])
+
+    def describe_batch(self, faces):
+        return lbph.compute_histograms(faces, **self.params)
+
+    def train(self, faces, labels):
+        self.state = self.reduce(self.describe_batch(faces), np.asarray(labels, np.int32))
+
+    def update(self, faces, labels):
+        # Histograms (and prototypes) are computed outside the lock, only the
+        # swap blocks readers. Writers are serialized by the Recognizer.
+        histograms, labels = self.describe_batch(faces), np.asarray(labels, np.int32)
+        if self.prototypes:
+            # Re-cluster the updated users from their kept prototypes plus the new samples
+            gallery, gallery_labels = self.state
+            previous = np.isin(gallery_labels, labels)
+            histograms, labels = self.reduce(np.concatenate([gallery[previous], histograms]),
+                                             np.concatenate([gallery_labels[previous], labels]))
+        self.lock.acquire_write()
+        try:
+            gallery, gallery_labels = self.state
+            if self.prototypes:
+                keep = ~np.isin(gallery_labels, labels)
+                gallery, gallery_labels = gallery[keep], gallery_labels[keep]
+            self.state = (np.concatenate([gallery, histograms]), np.concatenate([gallery_labels, labels]))
+        finally:
+            self.lock.release_write()
+
+    def compact(self, prototypes):
+        # Shrinks the live gallery to `prototypes` histograms per user, later
+        # updates keep it compact
+        self.prototypes = prototypes
+        histograms, labels = self.reduce(*self.state)
+        self.lock.acquire_write()
+        try:
+            self.state = (histograms, labels)
+        finally:
+            self.lock.release_write()
+
+    def reduce(self, histograms, labels):
+        if not self.prototypes or len(labels) == 0:
+            return histograms, labels
+        return lbph.compact_gallery(histograms, labels, self.prototypes, shared_executor())
+
+    def predict(self, gray):
+        probe = self.describe_batch([gray])[0]
+        self.lock.acquire_read()
+        try:
+            gallery, labels = self.state
+            return lbph.nearest(gallery, labels, probe, shared_executor())
+        finally:
+            self.lock.release_read()
+
+    def predict_batch(self, grays):
+        # Scoring releases the GIL, so the faces of one frame (and other
+        # cameras' frames) are scored in parallel while the read lock is held once
+        if len(grays) <= 1:
+            return [self.predict(gray) for gray in grays]
+        probes = self.describe_batch(grays)
+        self.lock.acquire_read()
+        try:
+            gallery, labels = self.state
+            return list(shared_executor().map(lambda probe: lbph.nearest(gallery, labels, probe), probes))
+        finally:
+            self.lock.release_read()
+
+    def save(self, path):
+        histograms, labels = self.state
+        if model_store.is_yaml(path):
+            model_store.export_yaml(path, histograms, labels, self.params)
+        else:
+            model_store.write_store(path, histograms, labels, dict(self.params, prototypes=self.prototypes))
+
+    def load(self, path):
+        if model_store.is_yaml(path):
+            histograms, labels, params = model_store.import_yaml(path)
+        else:
+            histograms, labels, params = model_store.read_store(path)
+        prototypes = params.pop("prototypes")
+        if prototypes and not self.prototypes:
+            self.prototypes = prototypes  # A compacted model stays compact through later updates
+        self.params = params
+        self.state = (histograms, labels)
+
+
+class EmbeddingBackend:
+    # One L2-normalised float32 HOG descriptor per sample (or per user
+    # centroid) stored in a contiguous matrix. A probe is matched against the
+    # whole gallery with a single matrix-vector product (cosine distance).
+    # Large galleries can be searched through an approximate IVF index.
+    name = "embedding"
+    default_model_path = "face_model_embedding.npz"
+
+    def __init__(self, threshold=0.25, size=64, centroids=False, index_min_size=20000, index_lists=None,
+                 index_probes=8):
+        self.threshold = threshold  # Cosine distance cutoff, tune it on your own data
+        self.size = size            # Faces are resized to size x size before the descriptor
+        self.centroids = centroids  # Keep one mean descriptor per user instead of every sample
+        self.index_min_size = index_min_size  # Build the approximate index from this many rows
+        self.index_lists = index_lists
+        self.index_probes = index_probes
+        self.hog = cv2.HOGDescriptor((size, size), (16, 16), (8, 8), (8, 8), 9)
+        # (descriptors, labels, index) is replaced as a whole, readers take a snapshot
+        self.state = (np.empty((0, self.dimension()), np.float32), np.empty(0, np.int32), None)
+
+    def dimension(self):
+        return int(self.hog.getDescriptorSize())
+
+    def describe(self, gray):
+        face = cv2.resize(gray, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        descriptor = self.hog.compute(face).reshape(-1).astype(np.float32)
+        norm = np.linalg.norm(descriptor)
+        return descriptor / norm if norm > 0 else descriptor
+
+    def describe_batch(self, faces):
+        if len(faces) == 0:
+            return np.empty((0, self.dimension()), np.float32)
+        return np.stack([self.describe(face) for face in faces])
+
+    def train(self, faces, labels):
+        self.set_gallery(self.describe_batch(faces), np.asarray(labels, np.int32))
+
+    def update(self, faces, labels):
+        descriptors, gallery_labels, _ = self.state
+        if self.centroids:
+            # Recompute the centroids of the updated users from their new samples
+            labels = np.asarray(labels, np.int32)
+            keep = ~np.isin(gallery_labels, labels)
+            descriptors, gallery_labels = descriptors[keep], gallery_labels[keep]
+        self.set_gallery(np.concatenate([descriptors, self.describe_batch(faces)]),
+                         np.concatenate([gallery_labels, np.asarray(labels, np.int32)]))
+
+    def set_gallery(self, descriptors, labels, reduce=True):
+        if reduce and self.centroids and len(labels):
+            descriptors, labels = self.user_centroids(descriptors, labels)
+        descriptors = np.ascontiguousarray(descriptors, np.float32)
+        index = None
+        if len(labels) >= self.index_min_size:
+            index = IVFIndex(descriptors, self.index_lists, self.index_probes)
+        self.state = (descriptors, labels, index)
+
+    def user_centroids(self, descriptors, labels):
+        users = np.unique(labels)
+        centroids = np.stack([descriptors[labels == user].mean(axis=0) for user in users])
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        return centroids.astype(np.float32), users.astype(np.int32)
+
+    def predict(self, gray):
+        labels, distances = self.predict_descriptors(self.describe(gray)[None, :])
+        return int(labels[0]), float(distances[0])
+
+    def predict_batch(self, grays):
+        # All probes against the whole gallery in one matrix product
+        if len(grays) == 0:
+            return []
+        labels, distances = self.predict_descriptors(self.describe_batch(grays))
+        return [(int(label), float(distance)) for label, distance in zip(labels, distances)]
+
+    def predict_descriptors(self, probes):
+        descriptors, labels, index = self.state
+        if len(labels) == 0:
+            return np.full(len(probes), -1), np.full(len(probes), np.inf)
+        if index is not None:
+            rows, distances = index.search(probes)
+        else:
+            distances = 1.0 - probes @ descriptors.T  # (probes, gallery)
+            rows = distances.argmin(axis=1)
+            distances = distances[np.arange(len(probes)), rows]
+        return labels[rows], distances
+
+    def save(self, path):
+        descriptors, labels, _ = self.state
+        with open(path, "wb") as f:
+            np.savez(f, descriptors=descriptors, labels=labels, size=self.size, centroids=self.centroids)
+
+    def load(self, path):
+        with np.load(path) as data:
+            if int(data["size"]) != self.size:
+                self.size = int(data["size"])
+                self.hog = cv2.HOGDescriptor((self.size, self.size), (16, 16), (8, 8), (8, 8), 9)
+            self.centroids = bool(data["centroids"])
+            descriptors, labels = data["descriptors"], data["labels"]
+        self.set_gallery(descriptors, labels, reduce=False)  # Already reduced when saved
+
+
+class IVFIndex:
+    # Approximate nearest-neighbour search: the gallery is split into k-means
+    # lists and a probe is only compared against the rows of its closest lists.
+    def __init__(self, descriptors, lists=None, probes=8):
+        self.descriptors = descriptors
+        lists = lists or max(1, int(np.sqrt(len(descriptors))))
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1e-3)
+        _, assignment, centers = cv2.kmeans(descriptors, lists, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+        self.centers = centers.astype(np.float32)
+        assignment = assignment.reshape(-1)
+        self.lists = [np.flatnonzero(assignment == i) for i in range(lists)]
+        self.probes = min(probes, lists)
+
+    def search(self, probes):
+        nearest_lists = np.argsort(1.0 - probes @ self.centers.T, axis=1)[:, :self.probes]
+        rows = np.empty(len(probes), np.int64)
+        distances = np.empty(len(probes), np.float32)
+        for i, probe in enumerate(probes):
+            candidates = np.concatenate([self.lists[j] for j in nearest_lists[i]])
+            if candidates.size == 0:
+                candidates = np.arange(len(self.descriptors))
+            candidate_distances = 1.0 - self.descriptors[candidates] @ probe
+            best = candidate_distances.argmin()
+            rows[i] = candidates[best]
+            distances[i] = candidate_distances[best]
+        return rows, distances
+
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def shared_executor():
+    # One worker pool for batched scoring, shared by every backend instance
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="recognize")
+        return executor
+
+
+BACKENDS = {
+    LBPHBackend.name: LBPHBackend,
+    EmbeddingBackend.name: EmbeddingBackend,
+}
+
+
+def create_backend(name="lbph", **options):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown recognizer backend: {name} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name](**options)
@@ -7,9 +7,8 @@
 
 
 from PyQt5 import QtCore, QtGui, QtWidgets
-import pandas as pd
-import os
 import datetime
+from user_registry import get_registry
 
 class Ui_RegisterWindow(object):
     def setupUi(self, RegisterWindow, callback=None):
@@ -98,16 +97,8 @@ class Ui_RegisterWindow(object):
         register_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         type_user = self.sexBog_2.currentText()
 
-        # Save to users.xlsx
-        new_data = pd.DataFrame([[name, sex, register_time, type_user]], columns=["Name", "Sex", "RegisterTime", "Type"])
-        if not os.path.exists("users.xlsx"):
-            new_data.to_excel("users.xlsx", index=False)
-            user_id = 0
-        else:
-            old_data = pd.read_excel("users.xlsx")
-            user_id = old_data.shape[0]  # next index
-            combined = pd.concat([old_data, new_data], ignore_index=True)
-            combined.to_excel("users.xlsx", index=False)
+        # Save to the user registry (single-row insert)
+        user_id = get_registry().add_user(name, sex, register_time, type_user)
 
         # Notify main window to start capturing 100 images with user_{ID}
         if callback:
@@ -0,0 +1,89 @@
+# sample_quality.py
+import cv2
+import numpy as np
+
+
+def sharpness(gray):
+    # Variance of the Laplacian, low for blurred or smeared crops
+    return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+
+def dhash(gray, size=8):
+    # 64-bit difference hash: one bit per horizontal brightness step
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return np.packbits(bits.ravel())
+
+
+class SampleSelector:
+    # Decides which registration crops are worth keeping. A crop must be big
+    # and sharp enough, come from a confident detection of a whole, roughly
+    # frontal face (the box must not touch the frame border and must have a
+    # face-like aspect ratio), and differ from every accepted sample by at
+    # least min_distance hash bits. Capture ends at `target` samples, or after
+    # max_frames crops with whatever was accepted. With `preprocess` (the
+    # recognizer's FacePreprocessor) duplicates are judged on the normalized
+    # face the model will actually see.
+    def __init__(self, target=40, min_size=80, min_sharpness=40.0, min_score=0.8,
+                 max_aspect=1.4, min_distance=6, max_frames=900, preprocess=None):
+        self.target = target
+        self.min_size = min_size              # Face side in px at full resolution
+        self.min_sharpness = min_sharpness    # Laplacian variance on the 100x100 crop
+        self.min_score = min_score            # Detector confidence
+        self.max_aspect = max_aspect          # Longer side / shorter side of the box
+        self.min_distance = min_distance      # dHash Hamming distance to every accepted sample
+        self.max_frames = max_frames
+        self.preprocess = preprocess
+        self.reset()
+
+    def reset(self):
+        self.hashes = np.empty((0, 8), dtype=np.uint8)
+        self.frames = 0
+        self.rejected = {"size": 0, "partial": 0, "pose": 0, "score": 0, "blur": 0, "duplicate": 0}
+
+    @property
+    def accepted(self):
+        return len(self.hashes)
+
+    @property
+    def done(self):
+        return self.accepted >= self.target or (self.frames >= self.max_frames and self.accepted > 0)
+
+    def consider(self, face_img, bbox, frame_shape, score=None):
+        # Returns (accepted, reason), the reason is None for accepted crops
+        self.frames += 1
+        reason = self.check(face_img, bbox, frame_shape, score)
+        if reason is not None:
+            self.rejected[reason] += 1
+            return False, reason
+        return True, None
+
+    def check(self, face_img, bbox, frame_shape, score):
+        x, y, w, h = bbox
+        if min(w, h) < self.min_size:
+            return "size"
+        frame_h, frame_w = frame_shape[:2]
+        if x <= 0 or y <= 0 or x + w >= frame_w or y + h >= frame_h:
+            return "partial"
+        if max(w, h) / min(w, h) > self.max_aspect:
+            return "pose"
+        if score is not None and score < self.min_score:
+            return "score"
+
+        # Blur on the canonical size before equalization (CLAHE inflates the
+        # Laplacian several-fold), so the threshold does not depend on distance
+        gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY) if face_img.ndim == 3 else face_img
+        size = self.preprocess.size if self.preprocess is not None else (100, 100)
+        resized = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+        if sharpness(resized) < self.min_sharpness:
+            return "blur"
+        face_hash = dhash(self.preprocess(gray) if self.preprocess is not None else resized)
+        if len(self.hashes):
+            distances = np.unpackbits(np.bitwise_xor(self.hashes, face_hash), axis=1).sum(axis=1)
+            if distances.min() < self.min_distance:
+                return "duplicate"
+        self.hashes = np.vstack([self.hashes, face_hash])
+        return None
+
+    def stats(self):
+        return {"accepted": self.accepted, "frames": self.frames, "rejected": dict(self.rejected)}
@@ -0,0 +1,84 @@
+# sample_writer.py
+import os
+import cv2
+import queue
+import threading
+import zipfile
+
+
+class SampleWriter(threading.Thread):
+    # Encodes and writes registration samples on a background thread so the
+    # capture loop never waits on the disk. Jobs are processed in order:
+    # begin(folder), submit(index, image) ..., finish(callback).
+    def __init__(self, maxsize=32, archive=False, jpeg_quality=95):
+        super(SampleWriter, self).__init__(daemon=True)
+        self.queue = queue.Queue(maxsize=maxsize)  # Bounded, submit blocks when full
+        self.archive = archive  # Write all samples of a user into one samples.zip
+        self.jpeg_quality = jpeg_quality
+        self.folder = None
+        self.zip_file = None
+        self.written = 0
+        self.failed = 0
+
+    def begin(self, folder):
+        self.queue.put(("begin", folder))
+
+    def submit(self, index, face_img):
+        # The crop is a view into the live frame, copy it before it is drawn on
+        self.queue.put(("write", index, face_img.copy()))
+
+    def finish(self, callback=None):
+        # callback(folder, written) runs once every sample before it is on disk
+        self.queue.put(("finish", callback))
+
+    def stop(self):
+        self.queue.put(None)
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            try:
+                if job[0] == "begin":
+                    self.open_folder(job[1])
+                elif job[0] == "write":
+                    self.write_sample(job[1], job[2])
+                elif job[0] == "finish":
+                    self.close_folder(job[1])
+            except Exception as e:
+                print(f"Sample writer error: {e}")
+        self.close_folder(None)
+
+    def open_folder(self, folder):
+        self.close_folder(None)
+        os.makedirs(folder, exist_ok=True)  # Created once per user, not per sample
+        self.folder = folder
+        self.written = 0
+        self.failed = 0
+        if self.archive:
+            # JPEG data is already compressed, store it as is
+            self.zip_file = zipfile.ZipFile(os.path.join(folder, "samples.zip"), "w", zipfile.ZIP_STORED)
+
+    def write_sample(self, index, face_img):
+        ok, encoded = cv2.imencode(".jpg", face_img, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok or self.folder is None:
+            self.failed += 1
+            return
+        if self.zip_file is not None:
+            self.zip_file.writestr(f"{index}.jpg", encoded.tobytes())
+        else:
+            with open(os.path.join(self.folder, f"{index}.jpg"), "wb") as f:
+                f.write(encoded.tobytes())
+        self.written += 1
+
+    def close_folder(self, callback):
+        if self.zip_file is not None:
+            self.zip_file.close()
+            self.zip_file = None
+        folder, written = self.folder, self.written
+        self.folder = None
+        if callback:
+            callback(folder, written)
@@ -0,0 +1,226 @@
+# sightings.py
+import os
+import glob
+import queue
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+# One row per event. "start" and "end" bracket a track, "identity" is logged
+# whenever a track is recognized as someone other than before. end rows
+# carry the track's duration and its last known identity.
+FIELDS = ["time", "camera", "event", "track_id", "name", "type", "confidence", "x", "y", "w", "h", "duration"]
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sightings (
+        time REAL NOT NULL,
+        camera TEXT,
+        event TEXT NOT NULL,
+        track_id INTEGER,
+        name TEXT,
+        type TEXT,
+        confidence REAL,
+        x INTEGER, y INTEGER, w INTEGER, h INTEGER,
+        duration REAL
+    );
+    CREATE INDEX IF NOT EXISTS sightings_time ON sightings(time);
+    CREATE INDEX IF NOT EXISTS sightings_name ON sightings(name, time);
+"""
+
+
+def day_path(directory, timestamp):
+    # Rotation is by local calendar day: sightings/2024-05-01.db
+    return os.path.join(directory, datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d") + ".db")
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    # WAL lets the query CLI read while the app appends
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class SightingsLog(threading.Thread):
+    # Append-only sightings log. record() only queues the event, the frame
+    # loop never touches the disk; this thread writes everything queued in
+    # one transaction: events are collected for flush_interval seconds after
+    # the first one arrives, or until batch_size are waiting.
+    # When the queue is full new events are dropped and counted rather than
+    # blocking the caller.
+    def __init__(self, directory="sightings", batch_size=500, flush_interval=1.0, maxsize=10000):
+        super(SightingsLog, self).__init__(daemon=True)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.path = None  # File of the current day
+        self.conn = None
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.failed = 0
+
+    def record(self, timestamp, camera, event, track_id, name=None, user_type=None, confidence=None,
+               bbox=None, duration=None):
+        x, y, w, h = bbox if bbox is not None else (None, None, None, None)
+        try:
+            self.queue.put_nowait((timestamp, camera, event, track_id, name, user_type, confidence,
+                                   x, y, w, h, duration))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        # Writes whatever is still queued, then closes the file
+        self.queue.put(None)
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        running = True
+        while running:
+            batch = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = self.flush_interval if deadline is None else deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch:
+                self.write(batch)
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def write(self, batch):
+        # Events are in time order per camera, a batch may still straddle midnight
+        try:
+            paths = [day_path(self.directory, row[0]) for row in batch]
+            start = 0
+            for i in range(1, len(batch) + 1):
+                if i == len(batch) or paths[i] != paths[start]:
+                    self.insert(paths[start], batch[start:i])
+                    start = i
+            self.batches += 1
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Sightings log error: {e}")
+
+    def insert(self, path, rows):
+        if path != self.path:
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = connect(path)
+            self.path = path
+        with self.conn:
+            self.conn.executemany(f"INSERT INTO sightings ({', '.join(FIELDS)}) "
+                                  f"VALUES ({', '.join('?' * len(FIELDS))})", rows)
+        self.written += len(rows)
+
+    def stats(self):
+        return {"written": self.written, "queued": self.queue.qsize(), "dropped": self.dropped,
+                "batches": self.batches, "failed": self.failed}
+
+
+def day_files(directory, start=None, end=None):
+    # Daily files that can hold events between start and end (timestamps)
+    first = datetime.fromtimestamp(start).strftime("%Y-%m-%d") if start is not None else None
+    last = datetime.fromtimestamp(end).strftime("%Y-%m-%d") if end is not None else None
+    paths = []
+    for path in sorted(glob.glob(os.path.join(directory, "????-??-??.db"))):
+        day = os.path.splitext(os.path.basename(path))[0]
+        if (first is None or day >= first) and (last is None or day <= last):
+            paths.append(path)
+    return paths
+
+
+def query(directory="sightings", start=None, end=None, name=None, camera=None, event=None, limit=None):
+    # Events as dicts in time order. start/end are timestamps, name matches
+    # the identity exactly, the other filters are optional as well.
+    conditions, params = [], []
+    for column, operator, value in (("time", ">=", start), ("time", "<", end), ("name", "=", name),
+                                    ("camera", "=", camera), ("event", "=", event)):
+        if value is not None:
+            conditions.append(f"{column} {operator} ?")
+            params.append(value)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    results = []
+    for path in day_files(directory, start, end):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(FIELDS)} FROM sightings{where} ORDER BY time", params)
+            results.extend(dict(zip(FIELDS, row)) for row in cursor)
+        finally:
+            conn.close()
+        if limit is not None and len(results) >= limit:
+            break
+    return results[:limit] if limit is not None else results
+
+
+def summary(directory="sightings", start=None, end=None):
+    # Per identity: number of tracks it was recognized on, first and last
+    # time (the end of the last track it was recognized on)
+    people = {}
+    for row in query(directory, start, end):
+        if row["name"] is None or row["event"] == "start":
+            continue
+        person = people.setdefault(row["name"], {"name": row["name"], "type": row["type"], "tracks": set(),
+                                                 "first_seen": row["time"], "last_seen": row["time"]})
+        person["tracks"].add((row["camera"], row["track_id"]))
+        person["last_seen"] = row["time"]
+    return [dict(person, tracks=len(person["tracks"])) for person in people.values()]
+
+
+def parse_time(value):
+    # ISO date/time ("2024-05-01", "2024-05-01 14:30") -> timestamp
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Sightings log queries")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, help_text in (("query", "List events"), ("summary", "Who was seen, how often, first and last time")):
+        sub = subparsers.add_parser(command, help=help_text)
+        sub.add_argument("--since", help="Start time, ISO format, e.g. 2024-05-01 or '2024-05-01 14:30'")
+        sub.add_argument("--until", help="End time (exclusive), ISO format")
+        sub.add_argument("--hours", type=float, help="Only the last N hours")
+        if command == "query":
+            sub.add_argument("--name", help="Identity")
+            sub.add_argument("--camera")
+            sub.add_argument("--event", choices=["start", "identity", "end"])
+            sub.add_argument("--limit", type=int)
+    parser.add_argument("--dir", default="sightings")
+    args = parser.parse_args()
+
+    start, end = parse_time(args.since), parse_time(args.until)
+    if args.hours:
+        start = (datetime.now() - timedelta(hours=args.hours)).timestamp()
+
+    if args.command == "query":
+        for row in query(args.dir, start, end, args.name, args.camera, args.event, args.limit):
+            confidence = f"{row['confidence']:.1f}" if row["confidence"] is not None else "-"
+            duration = f" {row['duration']:.1f}s" if row["duration"] is not None else ""
+            print(f"{format_time(row['time'])} cam {row['camera']} {row['event']:<8} track {row['track_id']:<5} "
+                  f"{row['name'] or '-'} ({row['type'] or '-'}) {confidence} "
+                  f"[{row['x']}, {row['y']}, {row['w']}, {row['h']}]{duration}")
+    else:
+        for person in summary(args.dir, start, end):
+            print(f"{person['name']} ({person['type']}): {person['tracks']} tracks, "
+                  f"{format_time(person['first_seen'])} - {format_time(person['last_seen'])}")
@@ -0,0 +1,134 @@
+# tracks.py
+import numpy as np
+
+
+class Track:
+    # Everything the detector knows about one tracked face
+    __slots__ = ("face_id", "tracker", "bbox", "score", "first_seen", "last_seen", "last_frame",
+                 "unrecognized_start", "capture_in_progress", "capture_count", "current_user", "current_type",
+                 "best_confidence")
+
+    def __init__(self, face_id, bbox, now, frame_index):
+        self.face_id = face_id
+        self.tracker = None
+        self.bbox = bbox
+        self.score = None  # Detector confidence from the last detection
+        self.first_seen = now
+        self.last_seen = now
+        self.last_frame = frame_index
+        self.unrecognized_start = now
+        self.capture_in_progress = False
+        self.capture_count = 0
+        self.current_user = None
+        self.current_type = None
+        self.best_confidence = None  # Lowest match distance as current_user
+
+
+def associate(detections, track_boxes, gate=0.6, min_iou=0.1):
+    # Greedy one-to-one assignment of detections to tracks. Both arguments
+    # are (x, y, w, h) boxes. A pair is admissible when the boxes overlap by
+    # min_iou or the centres are closer than gate times the track's face
+    # size, so the tolerance follows the face instead of a fixed 50 px.
+    # Returns the matched track index per detection, or -1 for new faces.
+    matches = np.full(len(detections), -1, dtype=np.int64)
+    if len(detections) == 0 or len(track_boxes) == 0:
+        return matches
+
+    det = np.asarray(detections, dtype=np.float32).reshape(-1, 4)
+    trk = np.asarray(track_boxes, dtype=np.float32).reshape(-1, 4)
+    dx1, dy1 = det[:, 0:1], det[:, 1:2]
+    dx2, dy2 = dx1 + det[:, 2:3], dy1 + det[:, 3:4]
+    tx1, ty1 = trk[:, 0], trk[:, 1]
+    tx2, ty2 = tx1 + trk[:, 2], ty1 + trk[:, 3]
+
+    inter = (np.clip(np.minimum(dx2, tx2) - np.maximum(dx1, tx1), 0, None) *
+             np.clip(np.minimum(dy2, ty2) - np.maximum(dy1, ty1), 0, None))
+    union = det[:, 2:3] * det[:, 3:4] + trk[:, 2] * trk[:, 3] - inter
+    iou = inter / np.maximum(union, 1e-6)
+
+    distance = np.hypot((dx1 + dx2 - tx1 - tx2) / 2, (dy1 + dy2 - ty1 - ty2) / 2)
+    scale = np.maximum(trk[:, 2], trk[:, 3])
+    normalized = distance / np.maximum(scale, 1.0)
+
+    cost = normalized + (1.0 - iou)
+    cost[(iou < min_iou) & (normalized > gate)] = np.inf
+
+    # Cheapest admissible pairs first, each detection and track used once
+    order = np.argsort(cost, axis=None)
+    order = order[np.isfinite(cost.ravel()[order])]
+    used_tracks = np.zeros(len(trk), dtype=bool)
+    remaining = len(det)
+    for flat in order:
+        d, t = divmod(int(flat), len(trk))
+        if matches[d] >= 0 or used_tracks[t]:
+            continue
+        matches[d] = t
+        used_tracks[t] = True
+        remaining -= 1
+        if remaining == 0:
+            break
+    return matches
+
+
+class TrackStore:
+    # Live tracks keyed by face_id. A track expires when it has not been seen
+    # (detected or successfully tracked) for max_missed frames or max_age
+    # seconds, so memory and matching cost stay bounded over a long shift.
+    def __init__(self, max_missed=45, max_age=3.0):
+        self.max_missed = max_missed
+        self.max_age = max_age
+        self.tracks = {}
+        self.next_face_id = 0
+        self.expired = 0
+
+    def new_face_id(self):
+        face_id = self.next_face_id
+        self.next_face_id += 1
+        return face_id
+
+    def create(self, face_id, bbox, now, frame_index):
+        track = Track(face_id, bbox, now, frame_index)
+        self.tracks[face_id] = track
+        return track
+
+    def get(self, face_id):
+        return self.tracks.get(face_id)
+
+    def seen(self, track, bbox, now, frame_index):
+        track.bbox = bbox
+        track.last_seen = now
+        track.last_frame = frame_index
+
+    def match(self, boxes):
+        # Face id for each detected box, reusing live tracks where they match
+        tracks = list(self.tracks.values())
+        matches = associate(boxes, [track.bbox for track in tracks])
+        return [tracks[t].face_id if t >= 0 else self.new_face_id() for t in matches]
+
+    def expire(self, now, frame_index):
+        # Removes and returns the tracks that went stale
+        stale = [track for track in self.tracks.values()
+                 if frame_index - track.last_frame > self.max_missed or now - track.last_seen > self.max_age]
+        for track in stale:
+            del self.tracks[track.face_id]
+        self.expired += len(stale)
+        return stale
+
+    def clear(self):
+        # Removes and returns every live track, face ids keep counting up
+        dropped = list(self.tracks.values())
+        self.tracks.clear()
+        self.expired += len(dropped)
+        return dropped
+
+    def values(self):
+        return self.tracks.values()
+
+    def __contains__(self, face_id):
+        return face_id in self.tracks
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def stats(self):
+        return {"live": len(self.tracks), "expired": self.expired, "created": self.next_face_id}
@@ -0,0 +1,153 @@
+# user_registry.py
+import os
+import sqlite3
+import threading
+
+COLUMNS = ["Name", "Sex", "RegisterTime", "Type"]
+
+
+class UserRegistry:
+    # User metadata in an indexed SQLite table with an in-process cache.
+    # Ids are the old users.xlsx row numbers, so dataset/user_<id> folders and
+    # label map keys stay valid. Changes made through another connection are
+    # noticed via PRAGMA data_version and reload the cache.
+    def __init__(self, db_path="users.db", xlsx_path="users.xlsx"):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        is_new = not os.path.exists(db_path)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                sex TEXT,
+                register_time TEXT,
+                type TEXT NOT NULL DEFAULT 'User'
+            );
+            CREATE INDEX IF NOT EXISTS users_name ON users(name);
+            CREATE INDEX IF NOT EXISTS users_type ON users(type);
+        """)
+        self.cache = None  # id -> row dict, ordered by id
+        self.data_version = None
+
+        if is_new and xlsx_path and os.path.exists(xlsx_path):
+            count = self.import_xlsx(xlsx_path)
+            print(f"Imported {count} users from {xlsx_path} into {db_path}")
+
+    def import_xlsx(self, xlsx_path, replace=False):
+        # One-shot migration from the old workbook, row number becomes the id
+        import pandas as pd
+        df_users = pd.read_excel(xlsx_path)
+        rows = []
+        for idx, row in df_users.iterrows():
+            user_type = row["Type"] if "Type" in df_users.columns else "User"
+            rows.append((int(idx), str(row["Name"]), none_if_nan(row.get("Sex")),
+                         none_if_nan(row.get("RegisterTime")), normalize_type(user_type)))
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self.lock, self.conn:
+            self.conn.executemany(f"{verb} INTO users (id, name, sex, register_time, type) VALUES (?, ?, ?, ?, ?)",
+                                  rows)
+        self.cache = None
+        return len(rows)
+
+    def export_xlsx(self, xlsx_path):
+        import pandas as pd
+        rows = [[user["Name"], user["Sex"], user["RegisterTime"], user["Type"]] for user in self.all_users()]
+        pd.DataFrame(rows, columns=COLUMNS).to_excel(xlsx_path, index=False)
+
+    def refresh(self):
+        # Cheap check, data_version only moves when another connection wrote
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if self.cache is None or version != self.data_version:
+            self.data_version = version
+            cursor = self.conn.execute("SELECT id, name, sex, register_time, type FROM users ORDER BY id")
+            self.cache = {row[0]: make_user(row) for row in cursor}
+
+    def all_users(self):
+        with self.lock:
+            self.refresh()
+            return list(self.cache.values())
+
+    def get_user(self, user_id):
+        with self.lock:
+            self.refresh()
+            return self.cache.get(user_id)
+
+    def find_by_name(self, name):
+        with self.lock:
+            cursor = self.conn.execute("SELECT id, name, sex, register_time, type FROM users WHERE name = ?", (name,))
+            return [make_user(row) for row in cursor]
+
+    def add_user(self, name, sex, register_time, user_type):
+        # Single-row insert, returns the new user id
+        with self.lock, self.conn:
+            self.refresh()
+            user_id = max(self.cache, default=-1) + 1
+            row = (user_id, name, sex, register_time, normalize_type(user_type))
+            self.conn.execute("INSERT INTO users (id, name, sex, register_time, type) VALUES (?, ?, ?, ?, ?)", row)
+            self.cache[user_id] = make_user(row)
+        return user_id
+
+    def set_type(self, user_ids, user_type):
+        user_type = normalize_type(user_type)
+        with self.lock, self.conn:
+            self.refresh()
+            self.conn.executemany("UPDATE users SET type = ? WHERE id = ?", [(user_type, i) for i in user_ids])
+            for user_id in user_ids:
+                if user_id in self.cache:
+                    self.cache[user_id]["Type"] = user_type
+        return [self.cache[i]["Name"] for i in user_ids if i in self.cache]
+
+    def label_map(self):
+        return {str(user["id"]): {"name": user["Name"], "type": user["Type"]} for user in self.all_users()}
+
+
+def make_user(row):
+    user_id, name, sex, register_time, user_type = row
+    return {"id": user_id, "Name": name, "Sex": sex, "RegisterTime": register_time, "Type": user_type}
+
+
+def normalize_type(user_type):
+    # The register form says USER/ENEMY, the detector compares with User/Enemy
+    return "Enemy" if str(user_type).strip().lower() == "enemy" else "User"
+
+
+def none_if_nan(value):
+    if value is None or value != value:  # NaN is the only value not equal to itself
+        return None
+    return str(value)
+
+
+registries = {}
+registries_lock = threading.Lock()
+
+
+def get_registry(db_path="users.db"):
+    # One shared registry (connection + cache) per database file in the process
+    with registries_lock:
+        if db_path not in registries:
+            registries[db_path] = UserRegistry(db_path)
+        return registries[db_path]
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="User registry maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import users from an xlsx workbook")
+    import_parser.add_argument("xlsx", nargs="?", default="users.xlsx")
+    import_parser.add_argument("--replace", action="store_true", help="Overwrite users with the same id")
+    export_parser = subparsers.add_parser("export", help="Write all users to an xlsx workbook")
+    export_parser.add_argument("xlsx")
+    subparsers.add_parser("list", help="Print all users")
+    parser.add_argument("--db", default="users.db")
+    args = parser.parse_args()
+
+    registry = UserRegistry(args.db, xlsx_path=None)
+    if args.command == "import":
+        print(f"Imported {registry.import_xlsx(args.xlsx, args.replace)} users")
+    elif args.command == "export":
+        registry.export_xlsx(args.xlsx)
+    else:
+        for user in registry.all_users():
+            print(user)